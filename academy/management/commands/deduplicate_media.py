@@ -0,0 +1,26 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import FileField
+
+from academy.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = "Link the files uploaded before content addressed storage to their blobs."
+
+    def handle(self, *args, **options):
+        linked = 0
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if not isinstance(field, FileField) or not isinstance(
+                    field.storage, ContentAddressedStorage
+                ):
+                    continue
+                names = (
+                    model._default_manager.exclude(**{field.name: ""})
+                    .exclude(**{f"{field.name}__isnull": True})
+                    .values_list(field.name, flat=True)
+                )
+                for name in names.iterator():
+                    linked += field.storage.deduplicate(name)
+        self.stdout.write(self.style.SUCCESS(f"Successfully linked {linked} files."))
@@ -0,0 +1,60 @@
+import academy.models
+import academy.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("academy", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dancer",
+            name="identification_back_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=academy.storage.ContentAddressedStorage(),
+                upload_to=academy.models.id_back_picture_path,
+                validators=[academy.models.MaxFileSizeValidator(10485760)],
+                verbose_name="identification back image",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="dancer",
+            name="identification_front_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=academy.storage.ContentAddressedStorage(),
+                upload_to=academy.models.id_front_picture_path,
+                validators=[academy.models.MaxFileSizeValidator(10485760)],
+                verbose_name="identification front image",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="professor",
+            name="identification_back_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=academy.storage.ContentAddressedStorage(),
+                upload_to=academy.models.id_back_picture_path,
+                validators=[academy.models.MaxFileSizeValidator(10485760)],
+                verbose_name="identification back image",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="professor",
+            name="identification_front_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=academy.storage.ContentAddressedStorage(),
+                upload_to=academy.models.id_front_picture_path,
+                validators=[academy.models.MaxFileSizeValidator(10485760)],
+                verbose_name="identification front image",
+            ),
+        ),
+    ]
@@ -7,6 +7,8 @@ from django.utils import timezone
 from django.utils.deconstruct import deconstructible
 from django.utils.translation import gettext_lazy as _
 
+from academy.storage import content_addressed_storage
+
 
 class IdentificationTypeChoices(models.TextChoices):
     ID = "ID", _("ID")
@@ -162,6 +164,7 @@ class Dancer(models.Model):
     identification_front_image = models.ImageField(
         verbose_name=_("identification front image"),
         upload_to=id_front_picture_path,
+        storage=content_addressed_storage,
         null=True,
         blank=True,
         validators=[MaxFileSizeValidator(10485760)],
@@ -169,6 +172,7 @@ class Dancer(models.Model):
     identification_back_image = models.ImageField(
         verbose_name=_("identification back image"),
         upload_to=id_back_picture_path,
+        storage=content_addressed_storage,
         null=True,
         blank=True,
         validators=[MaxFileSizeValidator(10485760)],
@@ -249,6 +253,7 @@ class Professor(models.Model):
     identification_front_image = models.ImageField(
         verbose_name=_("identification front image"),
         upload_to=id_front_picture_path,
+        storage=content_addressed_storage,
         null=True,
         blank=True,
         validators=[MaxFileSizeValidator(10485760)],
@@ -256,6 +261,7 @@ class Professor(models.Model):
     identification_back_image = models.ImageField(
         verbose_name=_("identification back image"),
         upload_to=id_back_picture_path,
+        storage=content_addressed_storage,
         null=True,
         blank=True,
         validators=[MaxFileSizeValidator(10485760)],
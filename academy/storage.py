@@ -0,0 +1,124 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Folder, relative to the storage location, holding one blob per distinct content.
+BLOB_DIR = "blobs"
+
+
+def get_content_hash(file, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of an open file content."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    while chunk := file.read(chunk_size):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def get_path_content_hash(path):
+    with open(path, "rb") as file:
+        return get_content_hash(file)
+
+
+@deconstructible(path="academy.storage.ContentAddressedStorage")
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store every distinct content once, as a blob named after its SHA-256 hash, and each
+    logical file name as a hard link to it. The link count of a blob is its reference
+    count, so deleting the last logical name, e.g. from django-cleanup, removes it.
+    """
+
+    def get_blob_name(self, content_hash):
+        return f"{BLOB_DIR}/{content_hash[:2]}/{content_hash}"
+
+    def get_blob_path(self, content_hash):
+        return self.path(self.get_blob_name(content_hash))
+
+    def _write_temporary(self, content):
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        with open(path, "wb") as file:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        return path, digest.hexdigest()
+
+    def store_blob(self, path, content_hash):
+        """
+        Hard link a file as the blob of its content, unless the blob already exists.
+        Return the blob path.
+        """
+        blob = self.get_blob_path(content_hash)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            pass
+        return blob
+
+    def _save(self, name, content):
+        temporary, content_hash = self._write_temporary(content)
+        try:
+            while True:
+                blob = self.store_blob(temporary, content_hash)
+                full_path = self.path(name)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                try:
+                    os.link(blob, full_path)
+                    break
+                except FileExistsError:
+                    # The name was taken since get_available_name() checked it.
+                    name = self.get_available_name(name)
+                except FileNotFoundError:
+                    # The last reference to the blob was deleted in the meantime.
+                    continue
+        finally:
+            os.remove(temporary)
+        return str(name).replace("\\", "/")
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        path = self.path(name)
+        try:
+            links = os.stat(path).st_nlink
+        except FileNotFoundError:
+            return
+        # Only hash the content when this is the last name linked to the blob.
+        blob = self.get_blob_path(get_path_content_hash(path)) if links == 2 else None
+        super().delete(name)
+        if blob and os.path.exists(blob) and os.stat(blob).st_nlink == 1:
+            os.remove(blob)
+            # Leave no empty folders behind once the last blob is gone.
+            try:
+                os.rmdir(os.path.dirname(blob))
+                os.rmdir(self.path(BLOB_DIR))
+            except OSError:
+                pass
+
+    def deduplicate(self, name):
+        """
+        Replace a stored file that is not linked to a blob yet with a link to the blob
+        of its content. Return True if the file was linked.
+        """
+        path = self.path(name)
+        if not os.path.exists(path) or os.stat(path).st_nlink > 1:
+            return False
+        blob = self.store_blob(path, get_path_content_hash(path))
+        if os.path.samefile(blob, path):
+            return True
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.link(blob, temporary)
+        os.replace(temporary, path)
+        return True
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -1,14 +1,17 @@
 import os
 import shutil
+import tempfile
 from datetime import date
+from io import StringIO
 from unittest.mock import Mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from academy.models import Academy, Dancer, Professor
 
@@ -190,3 +193,62 @@ class ProfessorModelTest(ModuleBaseData):
         professor = Professor(**self.test_data)
         with self.assertRaises(ValidationError):
             professor.full_clean()
+
+
+class ContentAddressedStorageTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.image_content = b"GIF87a\x01\x00\x01\x00\x80\x01\x00\x00\x00\x00ccc,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00"
+        self.dancers = [
+            Dancer.objects.create(
+                academy=self.academy,
+                first_name="Test",
+                last_name="Dancer",
+                birth_date=date(2000, 1, 1),
+                identification_number=identification_number,
+            )
+            for identification_number in ["12345678", "87654321"]
+        ]
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_identical_files_are_stored_once(self):
+        # Check that identical uploads are links to the same blob.
+        for dancer in self.dancers:
+            dancer.identification_front_image = SimpleUploadedFile(
+                "test_file.gif", self.image_content
+            )
+            dancer.save()
+        first, second = [
+            dancer.identification_front_image.path for dancer in self.dancers
+        ]
+        self.assertTrue(os.path.samefile(first, second))
+        self.assertEqual(os.stat(first).st_nlink, 3)
+
+        # Check that the blob is only removed along with its last reference.
+        self.dancers[0].identification_front_image.delete(save=True)
+        self.assertEqual(os.stat(second).st_nlink, 2)
+        self.dancers[1].identification_front_image.delete(save=True)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "blobs")))
+
+    def test_deduplicate_existing_files(self):
+        # Check that files stored before the blobs existed are linked to them.
+        for dancer in self.dancers:
+            name = f"test_academy/Dancer/{dancer.identification_number}_front.gif"
+            os.makedirs(
+                os.path.join(self.media_root, "test_academy/Dancer"), exist_ok=True
+            )
+            with open(os.path.join(self.media_root, name), "wb") as image:
+                image.write(self.image_content)
+            Dancer.objects.filter(pk=dancer.pk).update(identification_front_image=name)
+        call_command("deduplicate_media", stdout=StringIO())
+        first, second = [
+            dancer.identification_front_image.path
+            for dancer in Dancer.objects.filter(academy=self.academy)
+        ]
+        self.assertTrue(os.path.samefile(first, second))
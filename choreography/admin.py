@@ -3,6 +3,7 @@ import io
 from django.contrib import admin, messages
 from django.contrib.admin import SimpleListFilter
 from django.contrib.auth import get_user_model
+from django.db.models import F, Sum
 from django.http import HttpResponse
 from django.shortcuts import render
 from django.template.loader import render_to_string
@@ -14,6 +15,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Alignment, Font
 from weasyprint import HTML
 
+from choreography.awards import get_award_average
 from choreography.forms import (
     AwardAdminForm,
     AwardFormSet,
@@ -24,7 +26,18 @@ from choreography.forms import (
     PaymentFormSet,
     ScoreInlineForm,
 )
-from choreography.models import Award, Choreography, Discount, Feedback, Payment, Score
+from choreography.models import (
+    Award,
+    Choreography,
+    Discount,
+    Feedback,
+    Payment,
+    Score,
+    TrackStatusChoices,
+)
+from choreography.payments import rollback_payment_batches
+from choreography.rankings import CategoryRanking
+from choreography.tasks import render_show_task, transcode_music_tracks_task
 
 OSUser = get_user_model()
 
@@ -59,13 +72,48 @@ class FullyPaidFilter(SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        paid_choreographies = [
-            choreography.pk for choreography in queryset if choreography.fully_paid
-        ]
         if self.value() == "true":
-            return queryset.filter(pk__in=paid_choreographies)
+            return queryset.filter(balance=0)
+        elif self.value() == "false":
+            return queryset.exclude(balance=0)
+        else:
+            return queryset
+
+
+class DepositPaidFilter(SimpleListFilter):
+    title = _("Deposit paid")
+    parameter_name = "deposit_paid"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("true", _("Yes")),
+            ("false", _("No")),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == "true":
+            return queryset.with_financials().filter(deposit_total__lte=F("paid_total"))
+        elif self.value() == "false":
+            return queryset.with_financials().filter(deposit_total__gt=F("paid_total"))
+        else:
+            return queryset
+
+
+class OverpaidFilter(SimpleListFilter):
+    title = _("Overpaid")
+    parameter_name = "overpaid"
+
+    def lookups(self, request, model_admin):
+        return (
+            ("true", _("Yes")),
+            ("false", _("No")),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() == "true":
+            return queryset.filter(balance__lt=0)
         elif self.value() == "false":
-            return queryset.exclude(pk__in=paid_choreographies)
+            return queryset.filter(balance__gte=0)
         else:
             return queryset
 
@@ -97,11 +145,22 @@ def assign_judge(judge):
 
 @admin.register(Choreography)
 class ChoreographyAdmin(admin.ModelAdmin):
-    list_display = ["order_number", "id", "name", "academy", "category", "dance_mode"]
+    list_display = [
+        "order_number",
+        "id",
+        "name",
+        "academy",
+        "category",
+        "dance_mode",
+        "balance",
+    ]
     list_filter = [
         "event",
         OrderNumberFilter,
         FullyPaidFilter,
+        DepositPaidFilter,
+        OverpaidFilter,
+        "track_status",
         "dance_mode",
         "category__type",
         "category__name",
@@ -116,6 +175,9 @@ class ChoreographyAdmin(admin.ModelAdmin):
         "hide_awards",
         "manage_payments",
         "set_order_number",
+        "show_rankings",
+        "render_show",
+        "transcode_music_tracks",
         "export_pdf",
         "export_event_excel",
         "export_accounting_excel",
@@ -167,6 +229,89 @@ class ChoreographyAdmin(admin.ModelAdmin):
             request, "choreography/choreography_set_order_number.html", context=context
         )
 
+    @admin.action(description=_("Show category rankings"))
+    def show_rankings(self, request, queryset):
+        choreographies_list = list(
+            queryset.filter(is_disqualified=False).select_related(
+                "academy", "category", "dance_mode"
+            )
+        )
+        rankings = {}
+        for choreography in choreographies_list:
+            ranking = rankings.setdefault(
+                choreography.event_id, CategoryRanking(choreography.event_id)
+            )
+            choreography.placement = ranking.get_placement(choreography.pk)
+            choreography.ranking_average = (
+                get_award_average(
+                    choreography.score_total,
+                    choreography.score_count,
+                    choreography.normalized_average,
+                )
+                if choreography.score_count
+                else None
+            )
+        # List every category and dance mode ranking from its first place.
+        choreographies_list.sort(
+            key=lambda choreography: (
+                choreography.event_id,
+                str(choreography.category),
+                str(choreography.dance_mode),
+                choreography.placement is None,
+                choreography.placement or (),
+            )
+        )
+        context = {
+            "choreographies_list": choreographies_list,
+            "has_permission": request.user.groups.filter(name="Admin").exists(),
+            "site_url": "/",
+            "title": _("Category rankings"),
+        }
+        return render(
+            request, "choreography/choreography_rankings.html", context=context
+        )
+
+    @admin.action(description=_("Render show files"))
+    def render_show(self, request, queryset):
+        show_dates = (
+            queryset.exclude(order_number__isnull=True)
+            .values_list("event_id", "schedule__date")
+            .distinct()
+            .order_by("schedule__date")
+        )
+        for event_pk, show_date in show_dates:
+            render_show_task.delay(event_pk, show_date.isoformat())
+        self.message_user(
+            request,
+            ngettext(
+                "Rendering %(count)d show file.",
+                "Rendering %(count)d show files.",
+                len(show_dates),
+            )
+            % {"count": len(show_dates)},
+            messages.SUCCESS,
+        )
+
+    @admin.action(description=_("Transcode music tracks"))
+    def transcode_music_tracks(self, request, queryset):
+        choreography_pks = list(
+            queryset.filter(track_status=TrackStatusChoices.READY)
+            .exclude(music_track="")
+            .exclude(music_track__isnull=True)
+            .values_list("pk", flat=True)
+        )
+        transcode_music_tracks_task.delay(choreography_pks)
+        self.message_user(
+            request,
+            ngettext(
+                "Transcoding %(count)d music track.",
+                "Transcoding %(count)d music tracks.",
+                len(choreography_pks),
+            )
+            % {"count": len(choreography_pks)},
+            messages.SUCCESS,
+        )
+
     @admin.action(description=_("Export to PDF"))
     def export_pdf(self, request, queryset):
         context = {
@@ -291,14 +436,18 @@ class ChoreographyAdmin(admin.ModelAdmin):
             gettext("Balance"),
         ]
 
-        ordered_queryset = queryset.order_by("pk")
+        ordered_queryset = (
+            queryset.with_financials()
+            .select_related("academy", "category", "dance_mode", "price")
+            .order_by("pk")
+        )
 
-        total_price_amount, total_paid_amount = 0, 0
-        for choreography in ordered_queryset:
-            total_price_amount += choreography.total_price
-            if choreography.payments.exists():
-                for payment in choreography.payments.all():
-                    total_paid_amount += payment.amount
+        totals = ordered_queryset.aggregate(
+            total_price_amount=Sum("price_total", default=0),
+            total_paid_amount=Sum("paid_total", default=0),
+        )
+        total_price_amount = totals["total_price_amount"]
+        total_paid_amount = totals["total_paid_amount"]
 
         title_cell = worksheet.cell(row=1, column=1)
         count = queryset.count()
@@ -330,20 +479,15 @@ class ChoreographyAdmin(admin.ModelAdmin):
 
         current_row = headers_row + 1
         for choreography in ordered_queryset:
-            total_discounts = 0
-            if choreography.discounts.exists():
-                for discount in choreography.discounts.all():
-                    total_discounts -= discount.amount
-
             row = [
                 choreography.pk,
                 choreography.category.__str__(),
                 choreography.dance_mode.__str__(),
                 choreography.academy.__str__(),
                 choreography.name,
-                choreography.dancers.count(),
+                choreography.dancer_count,
                 choreography.price.amount,
-                total_discounts,
+                -choreography.discount_total,
                 choreography.total_price,
                 -choreography.paid_amount,
                 choreography.balance,
@@ -398,7 +542,7 @@ class ChoreographyAdmin(admin.ModelAdmin):
                 "fields": (
                     ("order_number", "average_score"),
                     ("is_locked", "is_disqualified", "show_awards"),
-                    ("price", "total_price", "balance"),
+                    ("price", "total_price", "balance_amount"),
                     ("deposit_paid", "fully_paid"),
                 )
             },
@@ -413,7 +557,7 @@ class ChoreographyAdmin(admin.ModelAdmin):
             "average_score",
             "deposit_paid",
             "fully_paid",
-            "balance",
+            "balance_amount",
         ]
         if not request.user.is_superuser and obj:
             readonly_fields.extend([field.name for field in self.model._meta.fields])
@@ -494,7 +638,7 @@ class ChoreographyAdmin(admin.ModelAdmin):
         return f"$ {obj.total_price}"
 
     @admin.display(description=_("Balance"))
-    def balance(self, obj):
+    def balance_amount(self, obj):
         return f"$ {obj.balance}"
 
     @admin.display(boolean=True, description=_("Fully paid"))
@@ -508,7 +652,14 @@ class ChoreographyAdmin(admin.ModelAdmin):
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ["date", "choreography_name", "academy", "amount", "payment_method"]
+    list_display = [
+        "date",
+        "choreography_name",
+        "academy",
+        "amount",
+        "payment_method",
+        "batch",
+    ]
     list_filter = ["choreography__event", "payment_method", "date"]
     list_display_links = ["choreography_name"]
     search_fields = [
@@ -516,11 +667,12 @@ class PaymentAdmin(admin.ModelAdmin):
         "choreography__academy__name",
         "date",
         "choreography__name",
+        "=batch",
     ]
-    search_help_text = _("Search by academy, date, choreography ID or name.")
+    search_help_text = _("Search by academy, date, choreography ID, name or batch ID.")
     show_facets = admin.ShowFacets.ALWAYS
 
-    actions = ["export_excel"]
+    actions = ["export_excel", "rollback_batches"]
 
     @admin.display(description=_("Choreography name"))
     def choreography_name(self, obj):
@@ -530,6 +682,17 @@ class PaymentAdmin(admin.ModelAdmin):
     def academy(self, obj):
         return obj.choreography.academy
 
+    @admin.action(description=_("Roll back selected payments batches"))
+    def rollback_batches(self, request, queryset):
+        batches = queryset.exclude(batch=None).values_list("batch", flat=True)
+        deleted = rollback_payment_batches(set(batches))
+        message = ngettext(
+            "%(count)d payment was rolled back.",
+            "%(count)d payments were rolled back.",
+            deleted,
+        ) % {"count": deleted}
+        self.message_user(request, message, messages.SUCCESS)
+
     @admin.action(description=_("Export to Excel"))
     def export_excel(self, request, queryset):
         excel_file = io.BytesIO()
@@ -693,6 +856,7 @@ class AwardAdmin(admin.ModelAdmin):
             gettext("Dancers"),
             gettext("Dancers amount"),
             gettext("Average score"),
+            gettext("Placement"),
             gettext("Award"),
         ]
 
@@ -723,7 +887,12 @@ class AwardAdmin(admin.ModelAdmin):
             cell.font = Font(bold=True)
 
         current_row = headers_row + 1
+        rankings = {}
         for award in queryset.exclude(choreography__is_disqualified=True):
+            event_pk = award.choreography.event_id
+            placement = rankings.setdefault(
+                event_pk, CategoryRanking(event_pk)
+            ).get_placement(award.choreography_id)
             professors = [
                 professor.__str__() for professor in award.choreography.professors.all()
             ]
@@ -740,6 +909,7 @@ class AwardAdmin(admin.ModelAdmin):
                 "\n".join(dancers),
                 len(dancers),
                 award.choreography.average_score,
+                "%d/%d" % placement if placement else "-",
                 award.award_type.__str__(),
             ]
 
@@ -818,6 +988,16 @@ class ScoreAdmin(admin.ModelAdmin):
     search_help_text = _("Search by PK, academy or choreography name.")
     actions = ["set_is_locked", "set_is_unlocked"]
     show_facets = admin.ShowFacets.ALWAYS
+    change_list_template = "choreography/score_change_list.html"
+
+    def changelist_view(self, request, extra_context=None):
+        # Follow the live updates of the event the scores are filtered by.
+        event_pk = request.GET.get("choreography__event__id__exact", "")
+        extra_context = {
+            **(extra_context or {}),
+            "live_event_pk": int(event_pk) if event_pk.isdigit() else None,
+        }
+        return super().changelist_view(request, extra_context)
 
     @admin.display(description=_("Order number"))
     def choreography_order_number(self, obj):
@@ -0,0 +1,335 @@
+import os
+import struct
+import subprocess
+from datetime import timedelta
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import mediainfo_json
+
+# Bitrates in kbps indexed by [MPEG1][layer][bitrate index].
+MP3_BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+# Sample rates indexed by the MPEG version bits.
+MP3_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000],
+}
+# Bytes read while looking for the first MPEG audio frame.
+MP3_SYNC_WINDOW = 65536
+# Waveform peaks are computed from 8 kHz mono audio, one min/max pair every 10 ms.
+PEAKS_SAMPLE_RATE = 8000
+PEAKS_BUCKET_SIZE = 80
+
+
+def _read_at(file, offset, size):
+    file.seek(offset)
+    return file.read(size)
+
+
+def probe_wav_duration(file, size):
+    """Return the duration in seconds of a WAV file from its RIFF chunks."""
+    header = _read_at(file, 0, 12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+
+    byte_rate = None
+    offset = 12
+    while offset + 8 <= size:
+        chunk_id, chunk_size = struct.unpack("<4sI", _read_at(file, offset, 8))
+        if chunk_id == b"fmt ":
+            fmt = file.read(12)
+            if len(fmt) < 12:
+                return None
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+        elif chunk_id == b"data":
+            # Streamed files leave the data size unset.
+            if not byte_rate or chunk_size == 0xFFFFFFFF:
+                return None
+            data_size = min(chunk_size, size - offset - 8)
+            return data_size / byte_rate
+        offset += 8 + chunk_size + chunk_size % 2
+    return None
+
+
+def _parse_mp3_frame_header(header):
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15):
+        return None
+    if sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = MP3_BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    return {
+        "mpeg1": mpeg1,
+        "mono": header[3] >> 6 == 3,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "samples": samples,
+        "length": length,
+    }
+
+
+def probe_mp3_duration(file, size):
+    """
+    Return the duration in seconds of an MP3 file from its Xing, Info or VBRI header,
+    or from the bitrate of a constant bitrate stream.
+    """
+    offset = 0
+    header = _read_at(file, 0, 10)
+    if header[:3] == b"ID3" and len(header) == 10:
+        tag_size = 0
+        for byte in header[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        offset = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+
+    window = _read_at(file, offset, MP3_SYNC_WINDOW)
+    frame = None
+    for index in range(len(window) - 3):
+        frame = _parse_mp3_frame_header(window[index : index + 4])
+        if frame:
+            offset += index
+            window = window[index:]
+            break
+    if not frame:
+        return None
+
+    # A Xing or Info header right after the side information holds the frame count.
+    if frame["mpeg1"]:
+        side_info = 17 if frame["mono"] else 32
+    else:
+        side_info = 9 if frame["mono"] else 17
+    xing = window[4 + side_info : 4 + side_info + 12]
+    if xing[:4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", xing[4:8])[0]
+        if flags & 0x01 and len(xing) == 12:
+            frames = struct.unpack(">I", xing[8:12])[0]
+            return frames * frame["samples"] / frame["sample_rate"]
+        return None
+    vbri = window[36:54]
+    if vbri[:4] == b"VBRI" and len(vbri) == 18:
+        frames = struct.unpack(">I", vbri[14:18])[0]
+        return frames * frame["samples"] / frame["sample_rate"]
+
+    # Without a VBR header, only trust the bitrate if the next frame repeats it.
+    following = _parse_mp3_frame_header(window[frame["length"] : frame["length"] + 4])
+    if not following or following["bitrate"] != frame["bitrate"]:
+        return None
+    audio_size = size - offset
+    if size >= 128 and _read_at(file, size - 128, 3) == b"TAG":
+        audio_size -= 128
+    return audio_size * 8 / frame["bitrate"]
+
+
+def probe_ffprobe_duration(file):
+    """Return the duration in seconds reported by ffprobe for the container."""
+    uploaded = getattr(file, "file", file)
+    if hasattr(uploaded, "temporary_file_path"):
+        source = uploaded.temporary_file_path()
+    elif getattr(file, "_committed", False):
+        source = file.path
+    else:
+        # Small uploads only live in memory, so they are piped to ffprobe.
+        file.seek(0)
+        source = file
+    try:
+        info = mediainfo_json(source)
+        return float(info["format"]["duration"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def get_audio_format(file):
+    """Return the audio format detected from the first bytes of a file, if any."""
+    header = _read_at(file, 0, 12)
+    file.seek(0)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "avi"
+    if header[:3] == b"ID3" or _parse_mp3_frame_header(header[:4]):
+        return "mp3"
+    return None
+
+
+PROBES = {
+    "wav": probe_wav_duration,
+    "mp3": probe_mp3_duration,
+}
+
+
+def get_audio_duration(file):
+    """
+    Return the duration of an audio file reading only its header, or asking ffprobe
+    for the container metadata. Decode the whole file only if both are inconclusive.
+    """
+    ext = os.path.splitext(file.name)[1].lower().lstrip(".")
+    duration = None
+    probe = PROBES.get(ext)
+    if probe:
+        try:
+            duration = probe(file, file.size)
+        except (OSError, struct.error):
+            duration = None
+    if duration is None:
+        duration = probe_ffprobe_duration(file)
+    if duration is None:
+        file.seek(0)
+        duration = len(AudioSegment.from_file(file)) / 1000
+    file.seek(0)
+    return timedelta(seconds=duration)
+
+
+def run_ffmpeg(*args):
+    """Run the ffmpeg binary configured for pydub, raising CalledProcessError on failure."""
+    subprocess.run(
+        [AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-y", *args],
+        check=True,
+        capture_output=True,
+    )
+
+
+def get_loudnorm_args(loudness):
+    return [
+        "-vn",
+        "-af",
+        f"loudnorm=I={loudness}:TP=-1.5:LRA=11",
+        "-ar",
+        "44100",
+        "-ac",
+        "2",
+    ]
+
+
+def render_normalized_wav(source, target, loudness):
+    """Decode an audio file to 44.1 kHz stereo PCM with an EBU R128 loudness target."""
+    run_ffmpeg("-i", source, *get_loudnorm_args(loudness), "-c:a", "pcm_s16le", target)
+
+
+def render_normalized_mp3(source, target, loudness):
+    """Transcode an audio file to a 44.1 kHz stereo MP3 with an EBU R128 loudness target."""
+    run_ffmpeg(
+        "-i",
+        source,
+        *get_loudnorm_args(loudness),
+        "-c:a",
+        "libmp3lame",
+        "-q:a",
+        "2",
+        "-f",
+        "mp3",
+        target,
+    )
+
+
+def render_compressed_speech(source, target):
+    """
+    Transcode a voice recording to mono Opus, trimming its leading and trailing
+    silence by removing it from the start of the audio and of the reversed audio.
+    """
+    trim = "silenceremove=start_periods=1:start_threshold=-50dB:start_silence=0.2"
+    run_ffmpeg(
+        "-i",
+        source,
+        "-vn",
+        "-af",
+        f"{trim},areverse,{trim},areverse",
+        "-ac",
+        "1",
+        "-c:a",
+        "libopus",
+        "-b:a",
+        "24k",
+        "-application",
+        "voip",
+        "-f",
+        "ogg",
+        target,
+    )
+
+
+def render_silence_wav(target, seconds):
+    run_ffmpeg(
+        "-f",
+        "lavfi",
+        "-i",
+        "anullsrc=r=44100:cl=stereo",
+        "-t",
+        str(seconds),
+        "-c:a",
+        "pcm_s16le",
+        target,
+    )
+
+
+def get_wav_duration(path):
+    """Return the duration in seconds of a WAV file from its header."""
+    with open(path, "rb") as wav:
+        return probe_wav_duration(wav, os.path.getsize(path))
+
+
+def decode_pcm(source, sample_rate=PEAKS_SAMPLE_RATE):
+    """Return the signed 16-bit little endian mono samples of an audio file."""
+    result = subprocess.run(
+        [
+            AudioSegment.converter,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            source,
+            "-vn",
+            "-ac",
+            "1",
+            "-ar",
+            str(sample_rate),
+            "-f",
+            "s16le",
+            "-",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return result.stdout
+
+
+def compute_peaks(pcm, bucket_size=PEAKS_BUCKET_SIZE):
+    """
+    Return the interleaved int8 minimum and maximum of every bucket of the given signed
+    16-bit samples, as bytes.
+    """
+    samples = np.frombuffer(pcm, dtype="<i2")
+    samples = np.pad(samples, (0, -len(samples) % bucket_size))
+    buckets = samples.reshape(-1, bucket_size)
+    peaks = np.empty((len(buckets), 2), dtype=np.int8)
+    peaks[:, 0] = buckets.min(axis=1) >> 8
+    peaks[:, 1] = buckets.max(axis=1) >> 8
+    return peaks.tobytes()
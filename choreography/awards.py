@@ -0,0 +1,187 @@
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from choreography.models import Award, Choreography
+from event.models import AwardType
+
+# Seconds after which a claimed award recompute that never ran can be claimed again.
+AWARD_RECOMPUTE_TIMEOUT = 600
+
+
+class AwardTypeIndex:
+    """
+    Resolve the default award type of an average score from an index kept in the
+    cache, holding an event's non-special AwardType ranges sorted by minimum average
+    score and its default AwardType. The index is dropped whenever one of the event
+    award types changes.
+    """
+
+    def __init__(self, event_pk):
+        self.event_pk = event_pk
+
+    @staticmethod
+    def get_cache_key(event_pk):
+        return f"award_type_index_{event_pk}"
+
+    @classmethod
+    def invalidate(cls, event_pks):
+        cache.delete_many([cls.get_cache_key(event_pk) for event_pk in event_pks])
+
+    def get_index(self):
+        """Get the event's award type ranges and default, loading them if not cached."""
+        cache_key = self.get_cache_key(self.event_pk)
+        index = cache.get(cache_key)
+        if index is None:
+            award_types = AwardType.objects.filter(
+                event=self.event_pk, is_special=False
+            ).values_list("pk", "min_average_score", "max_average_score")
+            ranges = sorted(
+                (min_score, max_score, pk)
+                for pk, min_score, max_score in award_types
+                if min_score is not None and max_score is not None
+            )
+            default = next(
+                (
+                    pk
+                    for pk, min_score, max_score in award_types
+                    if min_score is None and max_score is None
+                ),
+                None,
+            )
+            index = {"ranges": ranges, "default": default}
+            cache.set(cache_key, index, None)
+        return index
+
+    def get_award_type_pk(self, average_score):
+        """Get the award type whose range holds the average score, or the default one."""
+        index = self.get_index()
+        ranges = index["ranges"]
+        i = bisect_right([min_score for min_score, _, _ in ranges], average_score)
+        if i and ranges[i - 1][1] >= average_score:
+            return ranges[i - 1][2]
+        return index["default"]
+
+
+def get_score_delta(previous_value, value):
+    """Return the (total, count) change of replacing a score value by another."""
+    return (value or 0) - (previous_value or 0), (value is not None) - (
+        previous_value is not None
+    )
+
+
+def update_score_columns(choreography_pk, total_delta, count_delta):
+    """
+    Add a score change to the running score total and count of a Choreography instance
+    and flag its default award for recompute. The caller must hold a lock on the changed
+    Score rows. Return False if nothing changed.
+    """
+    if not total_delta and not count_delta:
+        return False
+    Choreography.objects.filter(pk=choreography_pk).update(
+        score_total=F("score_total") + total_delta,
+        score_count=F("score_count") + count_delta,
+        award_recompute_date=timezone.now(),
+    )
+    return True
+
+
+def recount_score_columns(choreography_pk):
+    """
+    Recount the score total and count of a Choreography instance from its scores and
+    flag its default award for recompute if they changed. Return False if nothing
+    changed.
+    """
+    choreographies = Choreography.objects.filter(pk=choreography_pk)
+    columns = choreographies.get_score_columns()
+    with transaction.atomic():
+        # Once the row is locked, the recount sees the scores of earlier recounts.
+        list(choreographies.select_for_update().values_list("pk", flat=True))
+        updated = choreographies.exclude(**columns).update(
+            award_recompute_date=timezone.now(), **columns
+        )
+    return bool(updated)
+
+
+def get_award_recompute_key(choreography_pk):
+    return f"award_recompute_{choreography_pk}"
+
+
+def claim_award_recompute(choreography_pk):
+    """Return True only for the first score change asking for a pending recompute."""
+    return cache.add(
+        get_award_recompute_key(choreography_pk), True, AWARD_RECOMPUTE_TIMEOUT
+    )
+
+
+def get_award_average(score_total, score_count, normalized_average=None):
+    """Return the average score awards are assigned by, normalized if enabled."""
+    if settings.SCORE_NORMALIZATION and normalized_average is not None:
+        return normalized_average
+    return round(score_total / score_count, 2) if score_count else 0
+
+
+def recompute_default_award(choreography_pk):
+    """
+    Move the default award of a Choreography instance to the award type of its average
+    score, holding a lock on the award row so concurrent recomputes run one at a time.
+    Return the default award type.
+    """
+    # Score changes from now on ask for another recompute.
+    cache.delete(get_award_recompute_key(choreography_pk))
+    with transaction.atomic():
+        award = (
+            Award.objects.select_for_update()
+            .filter(choreography_id=choreography_pk, assigned_by_id=1)
+            .first()
+        )
+        choreographies = Choreography.objects.filter(pk=choreography_pk)
+        event_pk, *scores, recompute_date = choreographies.values_list(
+            "event",
+            "score_total",
+            "score_count",
+            "normalized_average",
+            "award_recompute_date",
+        ).get()
+        award_type_pk = AwardTypeIndex(event_pk).get_award_type_pk(
+            get_award_average(*scores)
+        )
+        if award and award_type_pk and award.award_type_id != award_type_pk:
+            award.award_type_id = award_type_pk
+            award.save(update_fields=["award_type", "change_date"])
+        # Keep the flag if another score changed while recomputing.
+        choreographies.filter(award_recompute_date=recompute_date).update(
+            award_recompute_date=None
+        )
+    return award_type_pk
+
+
+def reassign_default_awards(event_pk, averages):
+    """
+    Move the default award of every Choreography instance of an event to the award
+    type of the given {pk: average score}, counting missing ones as 0.
+    """
+    index = AwardTypeIndex(event_pk)
+    awards = Award.objects.select_for_update().filter(
+        choreography__event=event_pk, assigned_by_id=1
+    )
+    for award in awards:
+        award_type_pk = index.get_award_type_pk(averages.get(award.choreography_id, 0))
+        if award_type_pk and award.award_type_id != award_type_pk:
+            award.award_type_id = award_type_pk
+            award.save(update_fields=["award_type", "change_date"])
+
+
+def replay_award_recomputes(queryset=None):
+    """Recompute the default award of every flagged Choreography instance."""
+    queryset = Choreography.objects.all() if queryset is None else queryset
+    pks = list(
+        queryset.filter(award_recompute_date__isnull=False).values_list("pk", flat=True)
+    )
+    for pk in pks:
+        recompute_default_award(pk)
+    return len(pks)
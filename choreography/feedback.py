@@ -0,0 +1,60 @@
+import os
+import subprocess
+import uuid
+
+from academy.storage import get_content_hash
+from choreography.audio import render_compressed_speech
+from choreography.models import Feedback, feedback_path
+
+# Extension of the compressed Feedback instances audio files.
+FEEDBACK_AUDIO_EXTENSION = "ogg"
+
+
+def is_feedback_compressed(feedback):
+    return feedback.audio_file.name.lower().endswith(f".{FEEDBACK_AUDIO_EXTENSION}")
+
+
+def compress_feedback_audio(feedback_pk):
+    """
+    Replace the audio file of a Feedback instance with a trimmed Opus recording, keeping
+    the feedback_path naming plus a content hash. Return the new file name, or None if
+    nothing changed.
+    """
+    feedback = (
+        Feedback.objects.select_related("score__choreography__academy", "score__judge")
+        .filter(pk=feedback_pk)
+        .first()
+    )
+    if not feedback or not feedback.audio_file or is_feedback_compressed(feedback):
+        return None
+
+    audio_file = feedback.audio_file
+    storage = audio_file.storage
+    original_name = audio_file.name
+    root = os.path.splitext(
+        feedback_path(feedback, f"feedback.{FEEDBACK_AUDIO_EXTENSION}")
+    )[0]
+    rendering = storage.path(f"{root}.{uuid.uuid4().hex}.tmp")
+    try:
+        try:
+            render_compressed_speech(storage.path(original_name), rendering)
+        except (OSError, subprocess.CalledProcessError):
+            # Keep the uploaded recording if it can't be transcoded.
+            return None
+        # Named after its content, so tasks of different recordings never collide.
+        with open(rendering, "rb") as file:
+            content_hash = get_content_hash(file)
+        new_name = f"{root}_{content_hash[:12]}.{FEEDBACK_AUDIO_EXTENSION}"
+        # Only point to the compressed file if the recording was not replaced meanwhile.
+        updated = Feedback.objects.filter(
+            pk=feedback_pk, audio_file=original_name
+        ).update(audio_file=new_name)
+        if not updated:
+            return None
+        os.replace(rendering, storage.path(new_name))
+    finally:
+        if os.path.exists(rendering):
+            os.remove(rendering)
+    if original_name != new_name and storage.exists(original_name):
+        storage.delete(original_name)
+    return new_name
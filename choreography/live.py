@@ -0,0 +1,110 @@
+import json
+import logging
+from functools import cache
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from choreography.models import Choreography, Score
+
+logger = logging.getLogger(__name__)
+
+REDIS_SCHEMES = ("redis://", "rediss://", "unix://")
+
+
+def is_live_updates_enabled():
+    return settings.LIVE_UPDATES_URL.startswith(REDIS_SCHEMES)
+
+
+def get_channel(event_pk):
+    return f"live_updates_{event_pk}"
+
+
+@cache
+def get_redis(url):
+    return redis.Redis.from_url(url)
+
+
+def get_scoring_progress(event_pk):
+    """
+    Return how many of today's scores of an event are set and locked, and the order
+    number on stage: the first one of a choreography still missing a score.
+    """
+    scores = Score.objects.filter(
+        choreography__event=event_pk,
+        choreography__schedule__date=timezone.now().date(),
+    )
+    return scores.aggregate(
+        total=Count("pk"),
+        scored=Count("value"),
+        locked=Count("pk", filter=Q(is_locked=True)),
+        order_number=Min(
+            "choreography__order_number",
+            filter=Q(value__isnull=True, choreography__is_disqualified=False),
+        ),
+    )
+
+
+def publish(event_pk, kind, data):
+    """Send a live update to the event channel, never failing the calling request."""
+    if not is_live_updates_enabled():
+        return
+    message = json.dumps({"type": kind, "data": data})
+    try:
+        get_redis(settings.LIVE_UPDATES_URL).publish(get_channel(event_pk), message)
+    except redis.RedisError:
+        logger.warning("Could not publish the %s live update.", kind, exc_info=True)
+
+
+def publish_on_commit(event_pk, kind, data):
+    transaction.on_commit(lambda: publish(event_pk, kind, data))
+
+
+def publish_scoring_progress(event_pk):
+    # The progress is read once the changes are visible to other connections.
+    transaction.on_commit(
+        lambda: publish(event_pk, "progress", get_scoring_progress(event_pk))
+    )
+
+
+def publish_choreographies_progress(choreography_pks):
+    """Publish the scoring progress of the events of the given choreographies."""
+    if choreography_pks and is_live_updates_enabled():
+        event_pks = Choreography.objects.filter(pk__in=choreography_pks).values_list(
+            "event", flat=True
+        )
+        for event_pk in set(event_pks):
+            publish_scoring_progress(event_pk)
+
+
+def format_event(kind, data):
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_live_updates(event_pk, progress):
+    """
+    Yield the server-sent events of an event channel, starting with the given scoring
+    progress and sending a keepalive comment whenever the channel is idle.
+    """
+    client = redis.asyncio.Redis.from_url(settings.LIVE_UPDATES_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(get_channel(event_pk))
+    try:
+        yield format_event("progress", progress)
+        while True:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=settings.LIVE_UPDATES_KEEPALIVE,
+            )
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            update = json.loads(message["data"])
+            yield format_event(update["type"], update["data"])
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
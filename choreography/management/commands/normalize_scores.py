@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from choreography.normalization import normalize_event_scores
+from event.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the normalized average scores and default awards of the current "
+        "events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            type=int,
+            help="Only normalize the scores of the given event ID.",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["zscore", "trimmed"],
+            default=settings.SCORE_NORMALIZATION or None,
+            help="Score normalization to apply. Defaults to SCORE_NORMALIZATION.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["mode"]:
+            raise CommandError("No score normalization mode was given.")
+        events = Event.objects.filter(end_date__gte=timezone.now().date())
+        if options["event"]:
+            events = Event.objects.filter(pk=options["event"])
+
+        normalized = 0
+        for event_pk in events.values_list("pk", flat=True):
+            normalized += normalize_event_scores(event_pk, options["mode"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully normalized {normalized} choreographies scores."
+            )
+        )
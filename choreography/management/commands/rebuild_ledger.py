@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from choreography.models import Choreography
+from choreography.rankings import CategoryRanking
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the dancers amount, discounts, payments, balance and score columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            type=int,
+            help="Only rebuild the choreographies related to the given event ID.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Choreography.objects.all()
+        if options["event"]:
+            queryset = queryset.filter(event_id=options["event"])
+
+        updated = queryset.update_ledger()
+        CategoryRanking.invalidate(
+            set(queryset.values_list("event", flat=True).order_by())
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully rebuilt {updated} choreographies ledger.")
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from choreography.tracks import recover_music_track_renames
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume, or roll back, music track renames left behind by an interrupted run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rollback",
+            action="store_true",
+            help="Restore the previous music track names instead of resuming.",
+        )
+
+    def handle(self, *args, **options):
+        recovered = recover_music_track_renames(rollback=options["rollback"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully recovered {recovered} rename journals.")
+        )
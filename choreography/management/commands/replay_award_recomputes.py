@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from choreography.awards import replay_award_recomputes
+from choreography.models import Choreography
+
+
+class Command(BaseCommand):
+    help = "Recompute the default awards flagged by score changes that weren't applied."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event",
+            type=int,
+            help="Only replay the choreographies related to the given event ID.",
+        )
+
+    def handle(self, *args, **options):
+        queryset = Choreography.objects.all()
+        if options["event"]:
+            queryset = queryset.filter(event_id=options["event"])
+
+        replayed = replay_award_recomputes(queryset)
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully recomputed {replayed} default awards.")
+        )
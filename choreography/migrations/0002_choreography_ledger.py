@@ -0,0 +1,94 @@
+from django.db import migrations, models
+from django.db.models import Count, ExpressionWrapper, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_ledger(apps, schema_editor):
+    Choreography = apps.get_model("choreography", "Choreography")
+    Discount = apps.get_model("choreography", "Discount")
+    Payment = apps.get_model("choreography", "Payment")
+    Price = apps.get_model("event", "Price")
+
+    dancer_count = Coalesce(
+        Subquery(
+            Choreography.dancers.through.objects.filter(choreography=OuterRef("pk"))
+            .order_by()
+            .values("choreography")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+    discount_total = Coalesce(
+        Subquery(
+            Discount.objects.filter(choreography=OuterRef("pk"))
+            .order_by()
+            .values("choreography")
+            .annotate(total=Sum("amount"))
+            .values("total"),
+            output_field=models.FloatField(),
+        ),
+        0.0,
+    )
+    paid_total = Coalesce(
+        Subquery(
+            Payment.objects.filter(choreography=OuterRef("pk"))
+            .order_by()
+            .values("choreography")
+            .annotate(total=Sum("amount"))
+            .values("total"),
+            output_field=models.FloatField(),
+        ),
+        0.0,
+    )
+    price_amount = Subquery(
+        Price.objects.filter(pk=OuterRef("price")).values("amount")[:1]
+    )
+    Choreography.objects.update(
+        dancer_count=dancer_count,
+        discount_total=discount_total,
+        paid_total=paid_total,
+        balance=ExpressionWrapper(
+            price_amount * dancer_count - discount_total - paid_total,
+            output_field=models.FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0001_initial"),
+        ("event", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choreography",
+            name="dancer_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="dancers amount"
+            ),
+        ),
+        migrations.AddField(
+            model_name="choreography",
+            name="discount_total",
+            field=models.FloatField(
+                default=0, editable=False, verbose_name="discounts"
+            ),
+        ),
+        migrations.AddField(
+            model_name="choreography",
+            name="paid_total",
+            field=models.FloatField(
+                default=0, editable=False, verbose_name="paid amount"
+            ),
+        ),
+        migrations.AddField(
+            model_name="choreography",
+            name="balance",
+            field=models.FloatField(
+                db_index=True, default=0, editable=False, verbose_name="balance"
+            ),
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
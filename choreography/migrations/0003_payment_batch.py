@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0002_choreography_ledger"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="batch",
+            field=models.UUIDField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                null=True,
+                verbose_name="batch",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0003_payment_batch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choreography",
+            name="track_status",
+            field=models.PositiveSmallIntegerField(
+                choices=[(1, "Ready"), (2, "Processing"), (3, "Failed")],
+                default=1,
+                editable=False,
+                verbose_name="music track status",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0004_choreography_track_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choreography",
+            name="music_track_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=64,
+                verbose_name="music track hash",
+            ),
+        ),
+    ]
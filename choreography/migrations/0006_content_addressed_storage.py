@@ -0,0 +1,33 @@
+import academy.models
+import academy.storage
+import choreography.models
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0005_choreography_music_track_hash"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="choreography",
+            name="music_track",
+            field=models.FileField(
+                blank=True,
+                help_text="Allowed audio extensions: mp3, avi or wav up to 10 MB.",
+                null=True,
+                storage=academy.storage.ContentAddressedStorage(),
+                upload_to=choreography.models.track_path,
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        allowed_extensions=["mp3", "avi", "wav"],
+                        message="The selected file does not have a valid audio extension.",
+                    ),
+                    academy.models.MaxFileSizeValidator(10485760),
+                ],
+                verbose_name="music track",
+            ),
+        ),
+    ]
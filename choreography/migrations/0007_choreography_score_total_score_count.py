@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_score_columns(apps, schema_editor):
+    Choreography = apps.get_model("choreography", "Choreography")
+    Score = apps.get_model("choreography", "Score")
+    scores = (
+        Score.objects.filter(choreography=OuterRef("pk"), value__isnull=False)
+        .order_by()
+        .values("choreography")
+    )
+    Choreography.objects.update(
+        score_total=Coalesce(
+            Subquery(scores.annotate(total=Sum("value")).values("total")), 0
+        ),
+        score_count=Coalesce(
+            Subquery(scores.annotate(count=Count("pk")).values("count")), 0
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0006_content_addressed_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choreography",
+            name="score_total",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="score total"
+            ),
+        ),
+        migrations.AddField(
+            model_name="choreography",
+            name="score_count",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="score count"
+            ),
+        ),
+        migrations.RunPython(fill_score_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0007_choreography_score_total_score_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choreography",
+            name="award_recompute_date",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                null=True,
+                verbose_name="award recompute date",
+            ),
+        ),
+    ]
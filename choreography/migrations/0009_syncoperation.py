@@ -0,0 +1,57 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0008_choreography_award_recompute_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncOperation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.UUIDField(editable=False, unique=True, verbose_name="key"),
+                ),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "Applied"),
+                            (2, "Locked"),
+                            (3, "Stale"),
+                            (4, "Invalid"),
+                        ],
+                        verbose_name="status",
+                    ),
+                ),
+                ("recorded_date", models.DateTimeField(verbose_name="recorded date")),
+                ("create_date", models.DateTimeField(auto_now_add=True)),
+                (
+                    "score",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sync_operations",
+                        to="choreography.score",
+                        verbose_name="score",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "sync operation",
+                "verbose_name_plural": "sync operations",
+                "ordering": ["recorded_date"],
+            },
+        ),
+    ]
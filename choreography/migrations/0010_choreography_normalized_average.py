@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("choreography", "0009_syncoperation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="choreography",
+            name="normalized_average",
+            field=models.FloatField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="normalized average score",
+            ),
+        ),
+    ]
@@ -1,16 +1,18 @@
 import os
-from datetime import date, timedelta
+from datetime import date
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import FileExtensionValidator, MaxValueValidator
 from django.db import models
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from pydub import AudioSegment
 
 from academy.models import Academy, Dancer, MaxFileSizeValidator, Professor
+from academy.storage import content_addressed_storage
 from event.models import AwardType, Category, DanceMode, Event, Price, Schedule
 
 OSUser = get_user_model()
@@ -24,6 +26,19 @@ class PaymentMethodChoices(models.IntegerChoices):
     OTHER = 5, _("Other")
 
 
+class TrackStatusChoices(models.IntegerChoices):
+    READY = 1, _("Ready")
+    PROCESSING = 2, _("Processing")
+    FAILED = 3, _("Failed")
+
+
+class SyncStatusChoices(models.IntegerChoices):
+    APPLIED = 1, _("Applied")
+    LOCKED = 2, _("Locked")
+    STALE = 3, _("Stale")
+    INVALID = 4, _("Invalid")
+
+
 def track_path(instance, filename):
     """Given a music file and its name, return the location and a formatted file name."""
     ext = filename.split(".")[-1]
@@ -35,6 +50,12 @@ def track_path(instance, filename):
     return f"{academy_name_snaked}/music_track/{choreography_name_snaked}.{ext}"
 
 
+def playback_path(content_hash):
+    """Given a music track content hash, return the location of its playback derivative."""
+    loudness = f"{abs(settings.AUDIO_LOUDNESS_TARGET):g}".replace(".", "_")
+    return f"playback/{content_hash[:2]}/{content_hash}_lufs{loudness}.mp3"
+
+
 def feedback_path(instance, filename):
     """Given an audio file and its name, return the location and a formatted file name."""
     ext = filename.split(".")[-1]
@@ -48,6 +69,94 @@ def feedback_path(instance, filename):
     )
 
 
+class ChoreographyQuerySet(models.QuerySet):
+    def with_financials(self):
+        """
+        Annotate each Choreography instance with its total price and deposit, computed by
+        the database from the persisted ledger columns in a single query.
+        """
+        return self.annotate(
+            price_total=ExpressionWrapper(
+                F("price__amount") * F("dancer_count") - F("discount_total"),
+                output_field=models.FloatField(),
+            ),
+        ).annotate(
+            deposit_total=ExpressionWrapper(
+                F("price_total") * F("event__deposit_percentage") / 100.0,
+                output_field=models.FloatField(),
+            ),
+        )
+
+    def update_ledger(self):
+        """
+        Recompute the dancers amount, discounts, payments, balance and score columns of
+        every Choreography instance in a single UPDATE and return the number of updated
+        rows.
+        """
+        dancer_count = Coalesce(
+            Subquery(
+                self.model.dancers.through.objects.filter(choreography=OuterRef("pk"))
+                .order_by()
+                .values("choreography")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+        discount_total = Coalesce(
+            Subquery(
+                Discount.objects.filter(choreography=OuterRef("pk"))
+                .order_by()
+                .values("choreography")
+                .annotate(total=Sum("amount"))
+                .values("total"),
+                output_field=models.FloatField(),
+            ),
+            0.0,
+        )
+        paid_total = Coalesce(
+            Subquery(
+                Payment.objects.filter(choreography=OuterRef("pk"))
+                .order_by()
+                .values("choreography")
+                .annotate(total=Sum("amount"))
+                .values("total"),
+                output_field=models.FloatField(),
+            ),
+            0.0,
+        )
+        price_amount = Subquery(
+            Price.objects.filter(pk=OuterRef("price")).values("amount")[:1]
+        )
+        return self.update(
+            dancer_count=dancer_count,
+            discount_total=discount_total,
+            paid_total=paid_total,
+            balance=ExpressionWrapper(
+                price_amount * dancer_count - discount_total - paid_total,
+                output_field=models.FloatField(),
+            ),
+            **self.get_score_columns(),
+        )
+
+    @staticmethod
+    def get_score_columns():
+        """Return the score total and count expressions of every Choreography instance."""
+        scores = (
+            Score.objects.filter(choreography=OuterRef("pk"), value__isnull=False)
+            .order_by()
+            .values("choreography")
+        )
+        return {
+            "score_total": Coalesce(
+                Subquery(scores.annotate(total=Sum("value")).values("total")), 0
+            ),
+            "score_count": Coalesce(
+                Subquery(scores.annotate(count=Count("pk")).values("count")), 0
+            ),
+        }
+
+
 class Choreography(models.Model):
     """
     Store a single Choreography instance, related to :model:`event.Event`, :model:`event.DanceMode`,
@@ -118,6 +227,7 @@ class Choreography(models.Model):
     music_track = models.FileField(
         verbose_name=_("music track"),
         upload_to=track_path,
+        storage=content_addressed_storage,
         blank=True,
         null=True,
         help_text=_("Allowed audio extensions: mp3, avi or wav up to 10 MB."),
@@ -129,14 +239,65 @@ class Choreography(models.Model):
             MaxFileSizeValidator(10485760),
         ],
     )
+    track_status = models.PositiveSmallIntegerField(
+        verbose_name=_("music track status"),
+        choices=TrackStatusChoices.choices,
+        default=1,
+        editable=False,
+    )
+    music_track_hash = models.CharField(
+        verbose_name=_("music track hash"),
+        max_length=64,
+        blank=True,
+        default="",
+        db_index=True,
+        editable=False,
+    )
+    # Ledger columns, kept up to date by signals and ChoreographyQuerySet.update_ledger.
+    dancer_count = models.PositiveIntegerField(
+        verbose_name=_("dancers amount"), default=0, editable=False
+    )
+    discount_total = models.FloatField(
+        verbose_name=_("discounts"), default=0, editable=False
+    )
+    paid_total = models.FloatField(
+        verbose_name=_("paid amount"), default=0, editable=False
+    )
+    balance = models.FloatField(
+        verbose_name=_("balance"), default=0, db_index=True, editable=False
+    )
+    # Running score columns, kept up to date by choreography.awards on score changes.
+    score_total = models.PositiveIntegerField(
+        verbose_name=_("score total"), default=0, editable=False
+    )
+    score_count = models.PositiveSmallIntegerField(
+        verbose_name=_("score count"), default=0, editable=False
+    )
+    award_recompute_date = models.DateTimeField(
+        verbose_name=_("award recompute date"),
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+    )
+    # Average of the normalized judges' scores, written by choreography.normalization.
+    normalized_average = models.FloatField(
+        verbose_name=_("normalized average score"),
+        blank=True,
+        null=True,
+        editable=False,
+    )
     create_date = models.DateTimeField(auto_now_add=True)
     change_date = models.DateTimeField(auto_now=True)
 
+    objects = ChoreographyQuerySet.as_manager()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._name = self.name
         self._order_number = self.order_number
         self._music_track = self.music_track
+        self._price_id = self.price_id
 
     class Meta:
         verbose_name = _("choreography")
@@ -149,26 +310,39 @@ class Choreography(models.Model):
     def save(self, *args, **kwargs):
         # Change music track path and name if instance name or order number changed.
         if self.music_track:
-            if any(
+            if self.music_track != self._music_track:
+                # New music tracks are validated and measured by process_music_track.
+                self.track_status = TrackStatusChoices.PROCESSING
+                self.music_track_hash = ""
+                if not self.duration:
+                    self.duration = self.category.max_duration
+            elif any(
                 [
                     self.name != self._name,
                     self.order_number != self._order_number,
                 ]
             ):
                 self.rename_music_track()
-
-            # Change duration if music track changed.
-            if self.music_track != self._music_track:
-                audio = AudioSegment.from_file(self.music_track)
-                duration_in_seconds = len(audio) / 1000
-                self.duration = timedelta(seconds=duration_in_seconds)
         else:
             self.duration = self.category.max_duration
-
+            self.track_status = TrackStatusChoices.READY
+            self.music_track_hash = ""
+
+        update_fields = kwargs.get("update_fields")
+        # Payment, Discount and dancers signals keep the other ledger inputs up to date.
+        price_changed = (
+            not self._state.adding
+            and self.price_id != self._price_id
+            and (update_fields is None or "price" in update_fields)
+        )
         super().save(*args, **kwargs)
         self._name = self.name
         self._order_number = self.order_number
         self._music_track = self.music_track
+        self._price_id = self.price_id
+
+        if price_changed:
+            self.update_ledger()
 
     def get_absolute_url(self):
         """Get a string that can be used to refer to the instance detail view."""
@@ -197,36 +371,28 @@ class Choreography(models.Model):
     @property
     def discount_amount(self):
         """Get all related Discount instances amount."""
-        total = 0
-        if self.discounts.exists():
-            for discount in self.discounts.all():
-                total += discount.amount
-        return total
+        return self.discount_total
 
     @property
     def total_price(self):
-        return self.price.amount * self.dancers.count() - self.discount_amount
+        if hasattr(self, "price_total"):
+            return self.price_total
+        return self.price.amount * self.dancer_count - self.discount_total
 
     @property
     def total_price_without_discounts(self):
-        return self.price.amount * self.dancers.count()
+        return self.price.amount * self.dancer_count
 
     @property
     def deposit_amount(self):
+        if hasattr(self, "deposit_total"):
+            return self.deposit_total
         return self.total_price * (self.event.deposit_percentage / 100)
 
     @property
     def paid_amount(self):
         """Get all related Payment instances amount."""
-        amount_paid = 0
-        for payment in self.payments.all():
-            if payment:
-                amount_paid += payment.amount
-        return amount_paid
-
-    @property
-    def balance(self):
-        return self.total_price - self.paid_amount
+        return self.paid_total
 
     @property
     def balance_without_discounts(self):
@@ -243,26 +409,49 @@ class Choreography(models.Model):
             return round(scores_total / scores_not_none, 2)
         return scores_total
 
+    def update_ledger(self):
+        """Recompute and reload the instance ledger columns."""
+        queryset = Choreography.objects.filter(pk=self.pk)
+        queryset.update_ledger()
+        ledger = queryset.values(
+            "dancer_count", "discount_total", "paid_total", "balance"
+        ).get()
+        for field, value in ledger.items():
+            setattr(self, field, value)
+
+    @property
+    def music_track_processing(self):
+        return self.track_status == TrackStatusChoices.PROCESSING
+
+    @property
+    def music_track_failed(self):
+        return self.track_status == TrackStatusChoices.FAILED
+
+    @property
+    def playback_track_name(self):
+        """Return the loudness normalized MP3 derivative name, if it was rendered."""
+        if not self.music_track_hash:
+            return None
+        name = playback_path(self.music_track_hash)
+        return name if self.music_track.storage.exists(name) else None
+
+    def get_music_track_name(self):
+        """Return the normalized music track name for the current name and order number."""
+        return track_path(self, self.music_track.name)
+
     def rename_music_track(self):
         """Rename the audio file if music track and order number exist."""
-        ext = self.music_track.name.split(".")[-1]
-        academy_name_snaked = self.academy.name.replace(" ", "_")
-        choreography_name_lowered = self.name.lower().strip().replace('"', "")
-        choreography_name_snaked = choreography_name_lowered.replace(" ", "_")
-        if self.order_number:
-            new_name = f"{academy_name_snaked}/music_track/{self.order_number:05d}_{choreography_name_snaked}.{ext}"
-        else:
-            new_name = (
-                f"{academy_name_snaked}/music_track/{choreography_name_snaked}.{ext}"
-            )
-        self.music_track = new_name
+        new_name = self.get_music_track_name()
+        storage = self._music_track.storage
+        if storage.exists(new_name):
+            # Keep the current name instead of overwriting another music track.
+            self.music_track = self._music_track.name
+            return
 
-        path = f"{settings.MEDIA_ROOT}/{academy_name_snaked}/music_track/"
-        # Check if the choreography name matches the stashed music track and rename.
-        _music_track = self._music_track.name.split("/")[-1]
-        for root, dirs, files in os.walk(path):
-            if _music_track in files:
-                os.rename(self._music_track.path, f"{settings.MEDIA_ROOT}/{new_name}")
+        self.music_track = new_name
+        # Check if the stashed music track exists and rename it.
+        if storage.exists(self._music_track.name):
+            os.rename(self._music_track.path, storage.path(new_name))
 
 
 class Award(models.Model):
@@ -353,6 +542,9 @@ class Payment(models.Model):
         default=1,
     )
     date = models.DateField(verbose_name=_("date"), default=date.today)
+    batch = models.UUIDField(
+        verbose_name=_("batch"), blank=True, null=True, db_index=True, editable=False
+    )
     create_date = models.DateTimeField(auto_now_add=True)
     change_date = models.DateTimeField(auto_now=True)
 
@@ -431,3 +623,31 @@ class Feedback(models.Model):
 
     def __str__(self):
         return f"{self.score.choreography} | {self.score.judge}"
+
+
+class SyncOperation(models.Model):
+    """
+    Store a single SyncOperation instance, related to :model:`choreography.Score`, with
+    the outcome of a score change made offline, so it is applied only once.
+    """
+
+    key = models.UUIDField(verbose_name=_("key"), unique=True, editable=False)
+    score = models.ForeignKey(
+        Score,
+        models.CASCADE,
+        related_name="sync_operations",
+        verbose_name=_("score"),
+    )
+    status = models.PositiveSmallIntegerField(
+        verbose_name=_("status"), choices=SyncStatusChoices.choices
+    )
+    recorded_date = models.DateTimeField(verbose_name=_("recorded date"))
+    create_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("sync operation")
+        verbose_name_plural = _("sync operations")
+        ordering = ["recorded_date"]
+
+    def __str__(self):
+        return f"{self.score} | {self.get_status_display()}"
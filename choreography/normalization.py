@@ -0,0 +1,120 @@
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from choreography.awards import AWARD_RECOMPUTE_TIMEOUT, reassign_default_awards
+from choreography.models import Choreography, Score
+from choreography.rankings import CategoryRanking
+
+
+def get_score_matrix(event_pk):
+    """
+    Return the PKs of an event's scored choreographies and the judge × choreography
+    matrix of their score values, holding NaN where a judge didn't score.
+    """
+    rows = np.array(
+        Score.objects.filter(choreography__event=event_pk, value__isnull=False)
+        .order_by()
+        .values_list("judge", "choreography", "value"),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    judge_pks, judges = np.unique(rows[:, 0], return_inverse=True)
+    choreography_pks, choreographies = np.unique(rows[:, 1], return_inverse=True)
+    matrix = np.full((len(judge_pks), len(choreography_pks)), np.nan)
+    matrix[judges, choreographies] = rows[:, 2]
+    return choreography_pks, matrix
+
+
+def get_zscore_averages(matrix):
+    """
+    Return the average per choreography of every judge's scores as z-scores, rescaled
+    to the mean and spread of all the scores so they keep the 0 to 100 range.
+    """
+    means = np.nanmean(matrix, axis=1, keepdims=True)
+    deviations = np.nanstd(matrix, axis=1, keepdims=True)
+    # A judge who gave the same value to everyone doesn't move anyone.
+    zscores = (matrix - means) / np.where(deviations > 0, deviations, 1)
+    averages = np.nanmean(zscores, axis=0) * np.nanstd(matrix) + np.nanmean(matrix)
+    return np.clip(averages, 0, 100)
+
+
+def get_trimmed_averages(matrix, trim_count):
+    """
+    Return the average per choreography of its scores without the given number of
+    highest and lowest ones, only trimming choreographies with enough scores left.
+    """
+    counts = np.count_nonzero(~np.isnan(matrix), axis=0)
+    # Missing scores are sorted last, after the highest ones.
+    ordered = np.sort(matrix, axis=0)
+    trims = np.where(counts > 2 * trim_count, trim_count, 0)
+    positions = np.arange(len(matrix))[:, np.newaxis]
+    kept = (positions >= trims) & (positions < counts - trims)
+    return np.where(kept, ordered, 0).sum(axis=0) / (counts - 2 * trims)
+
+
+def get_normalized_averages(matrix, mode):
+    if mode == "zscore":
+        return get_zscore_averages(matrix)
+    if mode == "trimmed":
+        return get_trimmed_averages(matrix, settings.SCORE_TRIM_COUNT)
+    raise ValueError(f"Unknown score normalization: {mode!r}.")
+
+
+def get_score_normalization_key(event_pk):
+    return f"score_normalization_{event_pk}"
+
+
+def claim_score_normalization(event_pk):
+    """Return True only for the first score change asking for a pending normalization."""
+    return cache.add(
+        get_score_normalization_key(event_pk), True, AWARD_RECOMPUTE_TIMEOUT
+    )
+
+
+def has_pending_award_recomputes(event_pk):
+    return Choreography.objects.filter(
+        event=event_pk, award_recompute_date__isnull=False
+    ).exists()
+
+
+def normalize_event_scores(event_pk, mode=None):
+    """
+    Write the normalized average of every Choreography instance of an event, computed
+    at once over the event score matrix, and move their default awards accordingly if
+    awards are assigned by normalized scores. Return the number of normalized
+    choreographies.
+    """
+    mode = mode or settings.SCORE_NORMALIZATION
+    # Score changes from now on ask for another normalization.
+    cache.delete(get_score_normalization_key(event_pk))
+    started = timezone.now()
+    choreography_pks, matrix = get_score_matrix(event_pk)
+    averages = {}
+    if matrix.size:
+        averages = dict(
+            zip(
+                choreography_pks.tolist(),
+                np.round(get_normalized_averages(matrix, mode), 2).tolist(),
+            )
+        )
+
+    with transaction.atomic():
+        choreographies = Choreography.objects.filter(event=event_pk)
+        changed = [
+            Choreography(pk=pk, normalized_average=averages.get(pk))
+            for pk, average in choreographies.values_list("pk", "normalized_average")
+            if average != averages.get(pk)
+        ]
+        Choreography.objects.bulk_update(
+            changed, ["normalized_average"], batch_size=500
+        )
+        if settings.SCORE_NORMALIZATION:
+            CategoryRanking.invalidate([event_pk])
+            reassign_default_awards(event_pk, averages)
+            # Keep the flags of scores changed while normalizing.
+            choreographies.filter(award_recompute_date__lte=started).update(
+                award_recompute_date=None
+            )
+    return len(averages)
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.utils import timezone
+
+from choreography.models import Choreography
+
+
+def assign_order_numbers(order_numbers):
+    """
+    Set the order number of every Choreography instance in the given {pk: order number}
+    mapping with a single bulk update. Return the PKs whose order number changed.
+    """
+    current = dict(
+        Choreography.objects.filter(pk__in=order_numbers).values_list(
+            "pk", "order_number"
+        )
+    )
+    changed = [
+        Choreography(pk=pk, order_number=order_numbers[pk])
+        for pk, order_number in current.items()
+        if order_number != order_numbers[pk]
+    ]
+    with transaction.atomic():
+        Choreography.objects.bulk_update(changed, ["order_number"], batch_size=500)
+    return [choreography.pk for choreography in changed]
+
+
+def assign_default_order(queryset):
+    """
+    Clear the order number of every Choreography instance in the queryset and number
+    the ones from active events by schedule date, time and category max age. Return the
+    PKs whose order number changed.
+    """
+    ordered_pks = (
+        queryset.filter(event__end_date__gte=timezone.now().date())
+        .order_by("schedule__date", "schedule__time", "category__max_age")
+        .values_list("pk", flat=True)
+    )
+    order_numbers = dict.fromkeys(queryset.values_list("pk", flat=True))
+    order_numbers.update(
+        (pk, order_number) for order_number, pk in enumerate(ordered_pks, 1)
+    )
+    return assign_order_numbers(order_numbers)
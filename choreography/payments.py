@@ -0,0 +1,47 @@
+import uuid
+
+from django.db import transaction
+from django.db.models import F
+
+from choreography.models import Choreography, Payment
+
+
+def create_payment_batch(queryset, payment_method, payment_date, deposit=False):
+    """
+    Pay the deposit, or the whole balance, of every Choreography instance in the given
+    queryset. Amounts are computed in a single query and all Payment instances are
+    inserted at once inside a transaction. Return the batch ID and the created payments.
+    """
+    queryset = queryset.with_financials()
+    if deposit:
+        amounts = queryset.filter(deposit_total__gt=F("paid_total")).values_list(
+            "pk", "deposit_total"
+        )
+    else:
+        amounts = queryset.filter(balance__gt=0).values_list("pk", "balance")
+
+    batch = uuid.uuid4()
+    with transaction.atomic():
+        payments = Payment.objects.bulk_create(
+            [
+                Payment(
+                    choreography_id=choreography_pk,
+                    amount=amount,
+                    payment_method=payment_method,
+                    date=payment_date,
+                    batch=batch,
+                )
+                for choreography_pk, amount in amounts
+            ]
+        )
+        Choreography.objects.filter(
+            pk__in=[payment.choreography_id for payment in payments]
+        ).update_ledger()
+    return batch, payments
+
+
+def rollback_payment_batches(batches):
+    """Delete every Payment instance created by the given batches and return the amount."""
+    with transaction.atomic():
+        deleted, _ = Payment.objects.filter(batch__in=batches).delete()
+    return deleted
@@ -0,0 +1,145 @@
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from choreography.models import Choreography
+from event.models import Price
+
+
+class PriceResolver:
+    """
+    Resolve an event's prices from a timeline kept in the cache, holding the values of
+    every event Price instance grouped by category type and sorted by due date. The
+    timeline is dropped whenever one of the event prices is saved or deleted.
+    """
+
+    def __init__(self, event):
+        self.event = event
+        self.field_names = [field.attname for field in Price._meta.concrete_fields]
+
+    @staticmethod
+    def get_cache_key(event_pk):
+        return f"price_timeline_{event_pk}"
+
+    @classmethod
+    def invalidate(cls, event_pk):
+        cache.delete(cls.get_cache_key(event_pk))
+
+    def get_timeline(self):
+        """Get the event's prices values by category type, loading them if not cached."""
+        cache_key = self.get_cache_key(self.event.pk)
+        timeline = cache.get(cache_key)
+        if timeline is None:
+            timeline = {}
+            for price in (
+                Price.objects.filter(event=self.event)
+                .order_by("due_date", "pk")
+                .values(*self.field_names)
+            ):
+                timeline.setdefault(price["category_type"], []).append(price)
+            cache.set(cache_key, timeline, None)
+        return timeline
+
+    def get_current_price(self, category_type, today=None):
+        """Get the Price instance in force today for the given category type, if any."""
+        today = today or timezone.localdate()
+        prices = self.get_timeline().get(category_type, [])
+        i = bisect_left([price["due_date"] for price in prices], today)
+        if i < len(prices):
+            return Price.from_db(
+                None, self.field_names, [prices[i][name] for name in self.field_names]
+            )
+        return None
+
+    def get_next_due_date(self, category_type, today=None):
+        """Get the next due date for the given category type, or its last one if all passed."""
+        today = today or timezone.localdate()
+        prices = self.get_timeline().get(category_type, [])
+        for price in prices:
+            if price["due_date"] >= today:
+                return price["due_date"]
+        return prices[-1]["due_date"] if prices else None
+
+
+def get_current_prices(events, today):
+    """Map every (event ID, category type) pair to the Price instance in force today."""
+    prices = {}
+    for price in Price.objects.filter(event__in=events, due_date__gte=today).order_by(
+        "due_date"
+    ):
+        prices.setdefault((price.event_id, price.category_type), price)
+    return prices
+
+
+def get_price_transitions(since, until, event_pk=None):
+    """
+    Map every instant between the given datetimes at which a price stops being in force to
+    the (event ID, category type) pairs affected. A price is in force during its whole due
+    date, so the transition happens at the following midnight.
+    """
+    prices_qs = Price.objects.filter(
+        due_date__gte=timezone.localdate(since) - timedelta(days=1),
+        due_date__lt=timezone.localdate(until),
+    )
+    if event_pk:
+        prices_qs = prices_qs.filter(event_id=event_pk)
+
+    transitions = {}
+    for event_id, category_type, due_date in prices_qs.values_list(
+        "event", "category_type", "due_date"
+    ).distinct():
+        instant = timezone.make_aware(
+            datetime.combine(due_date + timedelta(days=1), time.min)
+        )
+        if since < instant <= until:
+            transitions.setdefault(instant, set()).add((event_id, category_type))
+    return transitions
+
+
+def reprice_choreographies(queryset=None, today=None):
+    """
+    Set the current price to every active Choreography instance whose deposit is not paid
+    yet, writing all changes at once. Return a report with one dictionary per change.
+    """
+    today = today or timezone.localdate()
+    if queryset is None:
+        queryset = Choreography.objects.all()
+
+    choreographies_qs = (
+        queryset.filter(event__end_date__gte=today)
+        .with_financials()
+        .filter(deposit_total__gt=F("paid_total"))
+        .annotate(category_type=F("category__type"), price_amount=F("price__amount"))
+    )
+    choreographies = list(choreographies_qs)
+    prices = get_current_prices(
+        {choreography.event_id for choreography in choreographies}, today
+    )
+
+    report, updated = [], []
+    for choreography in choreographies:
+        price = prices.get((choreography.event_id, choreography.category_type))
+        if price is None or price.pk == choreography.price_id:
+            continue
+        report.append(
+            {
+                "choreography": choreography.pk,
+                "old_price": choreography.price_id,
+                "old_amount": choreography.price_amount,
+                "new_price": price.pk,
+                "new_amount": price.amount,
+            }
+        )
+        choreography.price = price
+        updated.append(choreography)
+
+    with transaction.atomic():
+        Choreography.objects.bulk_update(updated, ["price"])
+        Choreography.objects.filter(
+            pk__in=[choreography.pk for choreography in updated]
+        ).update_ledger()
+    return report
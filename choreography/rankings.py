@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Window
+from django.db.models.functions import Cast, Coalesce, Rank, Round
+
+from choreography.models import Choreography
+
+# Seconds a cached ranking is kept, bounding how long a missed invalidation lasts.
+RANKING_TIMEOUT = 300
+
+
+class CategoryRanking:
+    """
+    Rank an event's scored choreographies within every category and dance mode by the
+    average score awards are assigned by, normalized if enabled, computing every
+    placement in a single query with window functions. Disqualified choreographies are
+    left out. The ranking is kept in the cache and
+    dropped once a change to the scores of the event is committed.
+    """
+
+    def __init__(self, event_pk):
+        self.event_pk = event_pk
+
+    @staticmethod
+    def get_cache_key(event_pk):
+        return f"category_ranking_{event_pk}"
+
+    @classmethod
+    def invalidate(cls, event_pks):
+        # Dropped after commit, so concurrent readers can't cache the old placements.
+        keys = [cls.get_cache_key(event_pk) for event_pk in event_pks]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @classmethod
+    def invalidate_choreographies(cls, choreography_pks):
+        """Drop the rankings of the events of the given choreographies."""
+        if choreography_pks:
+            cls.invalidate(
+                set(
+                    Choreography.objects.filter(pk__in=choreography_pks).values_list(
+                        "event", flat=True
+                    )
+                )
+            )
+
+    @staticmethod
+    def get_average():
+        """Return the average score expression awards are assigned by."""
+        average = Round(Cast("score_total", FloatField()) / F("score_count"), 2)
+        if settings.SCORE_NORMALIZATION:
+            return Coalesce("normalized_average", average)
+        return average
+
+    def get_placements(self):
+        """
+        Get the {pk: (place, entries)} placements of the event choreographies, loading
+        them if not cached.
+        """
+        cache_key = self.get_cache_key(self.event_pk)
+        placements = cache.get(cache_key)
+        if placements is None:
+            partition = [F("category"), F("dance_mode")]
+            rows = (
+                Choreography.objects.filter(
+                    event=self.event_pk, is_disqualified=False, score_count__gt=0
+                )
+                .annotate(average=self.get_average())
+                .annotate(
+                    place=Window(
+                        Rank(), partition_by=partition, order_by=F("average").desc()
+                    ),
+                    entries=Window(Count("pk"), partition_by=partition),
+                )
+                .values_list("pk", "place", "entries")
+            )
+            placements = {pk: (place, entries) for pk, place, entries in rows}
+            cache.set(cache_key, placements, RANKING_TIMEOUT)
+        return placements
+
+    def get_placement(self, choreography_pk):
+        """Get the (place, entries) placement of a choreography, None if not ranked."""
+        return self.get_placements().get(choreography_pk)
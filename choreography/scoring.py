@@ -0,0 +1,268 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from choreography.awards import (
+    claim_award_recompute,
+    get_score_delta,
+    recompute_default_award,
+    update_score_columns,
+)
+from choreography.live import publish_choreographies_progress
+from choreography.models import (
+    Choreography,
+    Feedback,
+    Score,
+    SyncOperation,
+    SyncStatusChoices,
+)
+from choreography.normalization import (
+    claim_score_normalization,
+    has_pending_award_recomputes,
+    normalize_event_scores,
+)
+from choreography.rankings import CategoryRanking
+from choreography.tasks import normalize_scores_task, recompute_award_task
+
+
+def schedule_award_recompute(choreography_pk):
+    """
+    Recompute the default award of a Choreography instance right away, or once the
+    award recompute delay is over if it is set.
+    """
+    delay = settings.AWARD_RECOMPUTE_DELAY
+    if not delay:
+        recompute_default_award(choreography_pk)
+        return
+
+    # Only the first change of a burst queues the recompute, which sees them all.
+    def schedule():
+        if claim_award_recompute(choreography_pk):
+            recompute_award_task.apply_async((choreography_pk,), countdown=delay)
+
+    transaction.on_commit(schedule)
+
+
+def schedule_score_normalization(event_pk):
+    """
+    Normalize the scores of an event once the transaction is committed, or once the
+    award recompute delay is over if it is set.
+    """
+    delay = settings.AWARD_RECOMPUTE_DELAY
+
+    def schedule():
+        if not delay:
+            # Score changes already normalized by an earlier callback are not flagged.
+            if has_pending_award_recomputes(event_pk):
+                normalize_event_scores(event_pk)
+        elif claim_score_normalization(event_pk):
+            normalize_scores_task.apply_async((event_pk,), countdown=delay)
+
+    transaction.on_commit(schedule)
+
+
+def schedule_award_recomputes(choreography_pks):
+    """
+    Schedule the default award recompute of the given Choreography instances or, when
+    scores are normalized, the normalization of their events once.
+    """
+    if not settings.SCORE_NORMALIZATION:
+        for choreography_pk in choreography_pks:
+            schedule_award_recompute(choreography_pk)
+        return
+    event_pks = Choreography.objects.filter(pk__in=choreography_pks).values_list(
+        "event", flat=True
+    )
+    for event_pk in set(event_pks):
+        schedule_score_normalization(event_pk)
+
+
+def clean_score_value(value):
+    """Return a submitted score value as an integer, counting a blank value as 0."""
+    try:
+        value = int(value) if value not in ("", None) else 0
+    except (TypeError, ValueError):
+        value = -1
+    if not 0 <= value <= 100:
+        raise ValidationError(
+            _("Score values must be whole numbers between 0 and 100.")
+        )
+    return value
+
+
+def save_score_values(scores, values, feedbacks):
+    """
+    Write the given {pk: value} values and {pk: file} feedback recordings of Score
+    instances already locked by the caller, with a single bulk update, and recompute the
+    default award of each affected choreography once. Return the saved instances.
+    """
+    now = timezone.now()
+    saved, deltas = [], {}
+    for score in scores:
+        value = values.get(score.pk, score.value)
+        if value == score.value and score.pk not in feedbacks:
+            continue
+        total_delta, count_delta = get_score_delta(score.value, value)
+        delta = deltas.setdefault(score.choreography_id, [0, 0])
+        delta[0] += total_delta
+        delta[1] += count_delta
+        score.value = value
+        # Feedback changes move the score past the sync cursor as well.
+        score.change_date = now
+        saved.append(score)
+    Score.objects.bulk_update(saved, ["value", "change_date"])
+
+    schedule_award_recomputes(
+        [
+            choreography_pk
+            for choreography_pk, (total_delta, count_delta) in deltas.items()
+            if update_score_columns(choreography_pk, total_delta, count_delta)
+        ]
+    )
+    # Bulk updates send no signals, so the events are updated once here.
+    CategoryRanking.invalidate_choreographies(list(deltas))
+    publish_choreographies_progress(list(deltas))
+
+    for pk, audio_file in feedbacks.items():
+        Feedback.objects.update_or_create(
+            score_id=pk, defaults={"audio_file": audio_file}
+        )
+    return saved
+
+
+def submit_scores(judge, event, values, feedbacks=None):
+    """
+    Save the given {pk: value} score values, and {pk: file} feedback recordings, of a
+    judge's Score instances of an event at once. Raise PermissionDenied, saving
+    nothing, if any of them is locked or not the judge's. Return the saved instances.
+    """
+    feedbacks = feedbacks or {}
+    values = {pk: clean_score_value(value) for pk, value in values.items()}
+    pks = set(values) | set(feedbacks)
+
+    with transaction.atomic():
+        scores = list(
+            Score.objects.select_for_update().filter(
+                pk__in=pks, judge=judge, choreography__event=event
+            )
+        )
+        if len(scores) != len(pks) or any(score.is_locked for score in scores):
+            raise PermissionDenied
+        return save_score_values(scores, values, feedbacks)
+
+
+def get_judge_scores(judge, event):
+    """Return the Score instances a judge scores today in an event."""
+    return Score.objects.filter(
+        judge=judge,
+        choreography__event=event,
+        choreography__schedule__date=timezone.now().date(),
+    )
+
+
+def serialize_score(score):
+    return {
+        "pk": score.pk,
+        "value": score.value,
+        "is_locked": score.is_locked,
+        "has_feedback": hasattr(score, "feedback"),
+        "change_date": score.change_date.isoformat(),
+    }
+
+
+def get_score_changes(judge, event, since=None):
+    """
+    Return the judge's scores of today changed after the given cursor, along with the
+    cursor to ask for the next changes.
+    """
+    scores = get_judge_scores(judge, event).select_related("feedback")
+    if since:
+        scores = scores.filter(change_date__gt=since)
+    scores = [serialize_score(score) for score in scores.order_by("change_date")]
+    return {
+        "scores": scores,
+        "cursor": scores[-1]["change_date"] if scores else since and since.isoformat(),
+    }
+
+
+def sync_scores(judge, event, operations, files):
+    """
+    Apply score changes made offline, each given as a dict with a unique "key", the
+    "score" PK, its "value", the client "recorded" datetime and whether a "feedback"
+    file named "feedback_<key>" was sent. Operations are applied in recorded order and
+    only once per key: replaying a key returns its first outcome. Changes to locked
+    scores, or older than the last change applied to the same score, are dropped.
+    Changes to missing scores, or to scores that are not the judge's, are answered as
+    forbidden without recording them. Return the {key: status} outcome of every
+    operation.
+    """
+    operations = sorted(operations, key=lambda operation: operation["recorded"])
+    keys = [operation["key"] for operation in operations]
+
+    with transaction.atomic():
+        scores = {
+            score.pk: score
+            for score in Score.objects.select_for_update().filter(
+                pk__in=[operation["score"] for operation in operations],
+                judge=judge,
+                choreography__event=event,
+            )
+        }
+        # Read the outcomes once the scores are locked, so a concurrent replay of the
+        # same operations sees the ones it waited for.
+        outcomes = {
+            str(key): status
+            for key, status in SyncOperation.objects.filter(key__in=keys).values_list(
+                "key", "status"
+            )
+        }
+        last_recorded = dict(
+            SyncOperation.objects.filter(
+                score__in=scores.values(), status=SyncStatusChoices.APPLIED
+            )
+            .values("score")
+            .annotate(last=Max("recorded_date"))
+            .values_list("score", "last")
+        )
+
+        values, feedbacks, created, forbidden = {}, {}, [], set()
+        for operation in operations:
+            key = operation["key"]
+            if key in outcomes:
+                continue
+            score = scores.get(operation["score"])
+            if score is None:
+                forbidden.add(key)
+                continue
+            recorded = operation["recorded"]
+            if score.is_locked:
+                status = SyncStatusChoices.LOCKED
+            elif last_recorded.get(score.pk) and recorded < last_recorded[score.pk]:
+                status = SyncStatusChoices.STALE
+            else:
+                try:
+                    values[score.pk] = clean_score_value(operation["value"])
+                except ValidationError:
+                    status = SyncStatusChoices.INVALID
+                else:
+                    status = SyncStatusChoices.APPLIED
+                    last_recorded[score.pk] = recorded
+                    if operation.get("feedback") and f"feedback_{key}" in files:
+                        feedbacks[score.pk] = files[f"feedback_{key}"]
+            outcomes[key] = status
+            created.append(
+                SyncOperation(
+                    key=key, score=score, status=status, recorded_date=recorded
+                )
+            )
+
+        save_score_values(list(scores.values()), values, feedbacks)
+        SyncOperation.objects.bulk_create(created)
+    results = {
+        key: SyncStatusChoices(status).name.lower() for key, status in outcomes.items()
+    }
+    results.update((key, "forbidden") for key in forbidden)
+    return results
@@ -0,0 +1,112 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+
+# Bytes read from disk per chunk of a partial response.
+RANGE_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return the (start, end) inclusive byte positions of a single range request, None if
+    the header is missing or not supported, or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        # A suffix range asks for the last bytes of the file.
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_protected_file(request, storage, name):
+    """
+    Serve a stored file after the permissions were checked by the calling view. Answer
+    conditional requests with 304, single byte ranges with 206, and let the front
+    server send the file when PROTECTED_MEDIA_SERVER is set.
+    """
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404
+    etag = get_etag(stat)
+    last_modified = stat.st_mtime
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if settings.PROTECTED_MEDIA_SERVER == "nginx":
+        # nginx handles byte ranges itself from an internal location.
+        response = HttpResponse(content_type=content_type)
+        # nginx matches the internal location against the decoded URI.
+        response["X-Accel-Redirect"] = f"{settings.PROTECTED_MEDIA_URL}{quote(name)}"
+    elif settings.PROTECTED_MEDIA_SERVER == "apache":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+    else:
+        byte_range = None
+        if_range = request.headers.get("If-Range")
+        if "Range" in request.headers and (
+            not if_range or if_range in parse_etags(etag)
+        ):
+            byte_range = parse_range(request.headers["Range"], stat.st_size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(path, start, end), status=206, content_type=content_type
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = end - start + 1
+        else:
+            response = StreamingHttpResponse(
+                read_range(path, 0, stat.st_size - 1), content_type=content_type
+            )
+            response["Content-Length"] = stat.st_size
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
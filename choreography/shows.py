@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from choreography.audio import (
+    get_wav_duration,
+    render_normalized_wav,
+    render_silence_wav,
+    run_ffmpeg,
+)
+from choreography.models import Choreography, TrackStatusChoices
+from choreography.tracks import get_music_track_storage, get_playlist_queryset
+
+# Folder, relative to the music track storage, holding the rendered show files.
+SHOW_DIR = "show"
+
+
+def get_show_name(event_pk, date):
+    """Return the storage name, without extension, of a schedule date show file."""
+    return f"{SHOW_DIR}/{event_pk}/{date.isoformat()}"
+
+
+def has_show_files(event_pk, date):
+    """Return True if the show audio and cue index of a schedule date were rendered."""
+    # The cue index is written last.
+    return get_music_track_storage().exists(f"{get_show_name(event_pk, date)}.json")
+
+
+def build_cue_index(choreographies, durations, gap):
+    """
+    Return the start offset and duration, in seconds, of every choreography in a show
+    where each segment of the given durations is followed by a silence gap.
+    """
+    cues = []
+    offset = 0
+    for choreography, duration in zip(choreographies, durations):
+        cues.append(
+            {
+                "order_number": choreography.order_number,
+                "choreography": choreography.pk,
+                "academy": choreography.academy.name,
+                "name": choreography.name,
+                "start": round(offset, 3),
+                "duration": round(duration, 3),
+            }
+        )
+        offset += duration + gap
+    return cues
+
+
+def escape_ffmetadata(value):
+    for character in "\\=;#\n":
+        value = value.replace(character, f"\\{character}")
+    return value
+
+
+def render_ffmetadata(cues):
+    lines = [";FFMETADATA1"]
+    for cue in cues:
+        title = f"{cue['order_number']:05d} {cue['academy']} - {cue['name']}"
+        lines.extend(
+            [
+                "[CHAPTER]",
+                "TIMEBASE=1/1000",
+                f"START={int(cue['start'] * 1000)}",
+                f"END={int((cue['start'] + cue['duration']) * 1000)}",
+                f"title={escape_ffmetadata(title)}",
+            ]
+        )
+    return "\n".join(lines) + "\n"
+
+
+def render_show(event_pk, date):
+    """
+    Render one continuous MP3 file with the ready music tracks of a schedule date, in
+    order number order, loudness normalized and separated by silence gaps. Store it
+    along with a JSON cue index and return the cue index.
+    """
+    choreographies = list(
+        get_playlist_queryset(
+            Choreography.objects.filter(event_id=event_pk, schedule__date=date)
+        )
+        .filter(track_status=TrackStatusChoices.READY)
+        .exclude(music_track="")
+        .exclude(music_track__isnull=True)
+    )
+    if not choreographies:
+        return []
+    storage = get_music_track_storage()
+    name = get_show_name(event_pk, date)
+    gap = settings.SHOW_SILENCE_GAP
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Each segment is decoded and normalized by its own ffmpeg process.
+        segments = [
+            os.path.join(workdir, f"{index:05d}.wav")
+            for index in range(len(choreographies))
+        ]
+        with ThreadPoolExecutor(max_workers=settings.AUDIO_WORKERS) as pool:
+            list(
+                pool.map(
+                    render_normalized_wav,
+                    [choreography.music_track.path for choreography in choreographies],
+                    segments,
+                    [settings.AUDIO_LOUDNESS_TARGET] * len(segments),
+                )
+            )
+        silence = os.path.join(workdir, "silence.wav")
+        render_silence_wav(silence, gap)
+
+        cues = build_cue_index(
+            choreographies, [get_wav_duration(segment) for segment in segments], gap
+        )
+        concat_list = os.path.join(workdir, "segments.txt")
+        with open(concat_list, "w") as segments_file:
+            for segment in segments:
+                segments_file.write(f"file '{segment}'\nfile '{silence}'\n")
+        metadata = os.path.join(workdir, "metadata.txt")
+        with open(metadata, "w") as metadata_file:
+            metadata_file.write(render_ffmetadata(cues))
+
+        os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+        rendered = storage.path(f"{name}.rendering.mp3")
+        run_ffmpeg(
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            concat_list,
+            "-i",
+            metadata,
+            "-map",
+            "0:a",
+            "-map_chapters",
+            "1",
+            "-c:a",
+            "libmp3lame",
+            "-q:a",
+            "2",
+            rendered,
+        )
+        os.replace(rendered, storage.path(f"{name}.mp3"))
+
+    with open(storage.path(f"{name}.json.tmp"), "w") as cues_file:
+        json.dump(cues, cues_file)
+    os.replace(storage.path(f"{name}.json.tmp"), storage.path(f"{name}.json"))
+    return cues
@@ -1,12 +1,44 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
 from django.dispatch import receiver
 from django.template.loader import render_to_string
+from django.utils.encoding import force_str
 from django.utils.translation import gettext_lazy as _
 
-from choreography.models import Award, Choreography, Score
-from choreography.tasks import send_confirmation_email_task
-from event.models import AwardType
+from academy.models import Dancer
+from choreography.awards import AwardTypeIndex, recount_score_columns
+from choreography.feedback import is_feedback_compressed
+from choreography.live import (
+    is_live_updates_enabled,
+    publish_on_commit,
+    publish_scoring_progress,
+)
+from choreography.models import (
+    Award,
+    Choreography,
+    Discount,
+    Feedback,
+    Payment,
+    Score,
+)
+from choreography.pricing import PriceResolver
+from choreography.rankings import CategoryRanking
+from choreography.scoring import schedule_award_recomputes
+from choreography.tasks import (
+    compress_feedback_audio_task,
+    process_music_track,
+    reprice_partition,
+    schedule_price_transitions,
+    send_confirmation_email_task,
+)
+from event.models import AwardType, Price
 
 
 @receiver(post_save, sender=Choreography, weak=False)
@@ -26,27 +58,43 @@ def set_default_award(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=Score, weak=False)
+@receiver(post_delete, sender=Score, weak=False)
 def update_award_type(sender, instance, **kwargs):
-    choreography = instance.choreography
+    update_fields = kwargs.get("update_fields")
+    if (kwargs.get("created") and instance.value is None) or (
+        update_fields is not None and "value" not in update_fields
+    ):
+        return
+    # Recounted from the database, as the instance may hold an outdated value.
+    choreography_pk = instance.choreography_id
+    if recount_score_columns(choreography_pk):
+        CategoryRanking.invalidate([instance.choreography.event_id])
+        schedule_award_recomputes([choreography_pk])
 
-    try:
-        award_type = AwardType.objects.get(
-            event=choreography.event,
-            is_special=False,
-            min_average_score__lte=choreography.average_score,
-            max_average_score__gte=choreography.average_score,
-        )
-    except AwardType.DoesNotExist:
-        award_type = AwardType.objects.get(
-            event=choreography.event,
-            is_special=False,
-            min_average_score=None,
-            max_average_score=None,
-        )
 
-    default_award = choreography.awards.get(assigned_by_id=1)
-    default_award.award_type = award_type
-    default_award.save()
+@receiver(post_save, sender=Choreography, weak=False)
+@receiver(post_delete, sender=Choreography, weak=False)
+def invalidate_category_ranking(sender, instance, **kwargs):
+    # Disqualifications and category or dance mode changes move the placements.
+    CategoryRanking.invalidate([instance.event_id])
+
+
+@receiver(post_save, sender=AwardType, weak=False)
+@receiver(pre_delete, sender=AwardType, weak=False)
+def invalidate_award_type_index(sender, instance, **kwargs):
+    AwardTypeIndex.invalidate(instance.event.values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=AwardType.event.through, weak=False)
+def invalidate_event_award_type_index(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if reverse:
+        AwardTypeIndex.invalidate([instance.pk])
+    elif action == "pre_clear":
+        AwardTypeIndex.invalidate(instance.event.values_list("pk", flat=True))
+    elif action in ["post_add", "post_remove"]:
+        AwardTypeIndex.invalidate(pk_set)
 
 
 @receiver(post_save, sender=Choreography, weak=False)
@@ -63,3 +111,119 @@ def send_choreography_email(sender, instance, created, **kwargs):
         send_confirmation_email_task.delay(
             subject, message, None, [recipient], _("choreography")
         )
+
+
+@receiver(post_save, sender=Choreography, weak=False)
+def process_uploaded_music_track(sender, instance, **kwargs):
+    if (
+        instance.music_track_processing
+        and instance.music_track != instance._music_track
+    ):
+        choreography_pk = instance.pk
+        transaction.on_commit(lambda: process_music_track.delay(choreography_pk))
+
+
+@receiver(post_save, sender=Feedback, weak=False)
+def compress_uploaded_feedback(sender, instance, **kwargs):
+    if instance.audio_file and not is_feedback_compressed(instance):
+        feedback_pk = instance.pk
+        transaction.on_commit(lambda: compress_feedback_audio_task.delay(feedback_pk))
+
+
+@receiver(post_save, sender=Payment, weak=False)
+@receiver(post_delete, sender=Payment, weak=False)
+@receiver(post_save, sender=Discount, weak=False)
+@receiver(post_delete, sender=Discount, weak=False)
+def update_choreography_ledger(sender, instance, **kwargs):
+    instance.choreography.update_ledger()
+    # A payment or discount moved to another choreography leaves the old one as well.
+    previous_pk = instance._choreography_id
+    if previous_pk and previous_pk != instance.choreography_id:
+        Choreography.objects.filter(pk=previous_pk).update_ledger()
+    instance._choreography_id = instance.choreography_id
+
+
+@receiver(post_init, sender=Payment, weak=False)
+@receiver(post_init, sender=Discount, weak=False)
+def stash_ledger_choreography(sender, instance, **kwargs):
+    instance._choreography_id = instance.__dict__.get("choreography_id")
+
+
+@receiver(post_save, sender=Score, weak=False)
+def publish_score_progress(sender, instance, **kwargs):
+    if is_live_updates_enabled():
+        publish_scoring_progress(instance.choreography.event_id)
+
+
+@receiver(post_save, sender=Choreography, weak=False)
+def publish_choreography_progress(sender, instance, **kwargs):
+    # Order number and disqualification changes move what is on stage.
+    if is_live_updates_enabled():
+        publish_scoring_progress(instance.event_id)
+
+
+@receiver(post_save, sender=Award, weak=False)
+def publish_award_change(sender, instance, **kwargs):
+    if is_live_updates_enabled():
+        publish_on_commit(
+            instance.choreography.event_id,
+            "award",
+            {
+                "choreography": instance.choreography_id,
+                "name": instance.choreography.name,
+                "award_type": force_str(instance.award_type.name),
+            },
+        )
+
+
+@receiver(m2m_changed, sender=Choreography.dancers.through, weak=False)
+def update_choreography_dancer_count(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    # Stash the related choreographies before a dancer's relations are cleared.
+    if reverse and action == "pre_clear":
+        instance._choreographies_pk = list(
+            instance.choreographies.values_list("pk", flat=True)
+        )
+    elif action in ["post_add", "post_remove", "post_clear"]:
+        if not reverse:
+            instance.update_ledger()
+        else:
+            if action == "post_clear":
+                pk_set = instance._choreographies_pk
+            Choreography.objects.filter(pk__in=pk_set).update_ledger()
+
+
+@receiver(pre_delete, sender=Dancer, weak=False)
+def stash_dancer_choreographies(sender, instance, **kwargs):
+    instance._choreographies_pk = list(
+        instance.choreographies.values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Dancer, weak=False)
+def update_dancer_choreographies_ledger(sender, instance, **kwargs):
+    Choreography.objects.filter(pk__in=instance._choreographies_pk).update_ledger()
+
+
+@receiver(post_save, sender=Price, weak=False)
+def update_price_choreographies_ledger(sender, instance, created, **kwargs):
+    if not created:
+        Choreography.objects.filter(price=instance).update_ledger()
+
+
+@receiver(post_save, sender=Price, weak=False)
+def reschedule_price_transitions(sender, instance, **kwargs):
+    # Reprice the partition right away in case the change applies today.
+    def reschedule():
+        reprice_partition.delay(instance.event_id, instance.category_type)
+        schedule_price_transitions.delay(instance.event_id)
+
+    if not settings.DEBUG:
+        transaction.on_commit(reschedule)
+
+
+@receiver(post_save, sender=Price, weak=False)
+@receiver(post_delete, sender=Price, weak=False)
+def invalidate_price_timeline(sender, instance, **kwargs):
+    PriceResolver.invalidate(instance.event_id)
@@ -1,5 +1,4 @@
 const feedbackSpan = document.getElementsByName("feedback")
-console.log(feedbackSpan)
 
 if (feedbackSpan) {
     for (var span of feedbackSpan) {
@@ -12,6 +11,14 @@ if (feedbackSpan) {
         audioElement.controlsList = "nodownload"
         audioElement.src = audio.src
 
+        const canvas = document.createElement("canvas")
+        canvas.className = "d-block mx-auto"
+        canvas.width = 300
+        canvas.height = 40
+        canvas.dataset.peaksUrl = span.dataset.peaksUrl
+
+        parentTd.appendChild(canvas)
         parentTd.appendChild(audioElement)
+        attachWaveform(canvas, audioElement)
     }
 }
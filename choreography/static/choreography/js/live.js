@@ -0,0 +1,46 @@
+// Seconds between scoring progress requests when the server can't stream updates.
+const LIVE_POLL_INTERVAL = 10
+
+function showProgress(element, progress) {
+    element.hidden = false
+    for (const field of element.querySelectorAll("[data-live]")) {
+        if (field.dataset.live in progress) {
+            field.textContent = progress[field.dataset.live] ?? "-"
+        }
+    }
+    // Highlight the choreography on stage when it is listed.
+    for (const row of document.querySelectorAll("tr[data-order-number]")) {
+        row.classList.toggle("table-primary", Number(row.dataset.orderNumber) === progress.order_number)
+    }
+}
+
+function showAward(element, award) {
+    const field = element.querySelector("[data-live='award']")
+    if (field) {
+        field.textContent = `${award.name}: ${award.award_type}`
+    }
+}
+
+async function pollProgress(element) {
+    const response = await fetch(`${element.dataset.liveUrl}?poll`)
+    if (response.ok) {
+        showProgress(element, await response.json())
+    }
+}
+
+function followLiveUpdates(element) {
+    const source = new EventSource(element.dataset.liveUrl)
+    source.addEventListener("progress", (event) => showProgress(element, JSON.parse(event.data)))
+    source.addEventListener("award", (event) => showAward(element, JSON.parse(event.data)))
+    source.addEventListener("error", () => {
+        // The server closed the stream for good, so fall back to polling the progress.
+        if (source.readyState === EventSource.CLOSED) {
+            pollProgress(element)
+            setInterval(() => pollProgress(element), LIVE_POLL_INTERVAL * 1000)
+        }
+    })
+}
+
+for (const element of document.querySelectorAll("[data-live-url]")) {
+    followLiveUpdates(element)
+}
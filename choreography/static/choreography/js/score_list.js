@@ -1,9 +1,10 @@
 var mediaRecorder
 var audio
 var playPromise
-var blob
 var _submitButton
-var alertModal
+// Changed scores and their feedback recordings, saved together by submitForm.
+const pendingScores = new Set()
+const blobs = {}
 
 function disableButtons() {
     const buttons = document.querySelectorAll("button")
@@ -160,8 +161,9 @@ function stopRecording(button) {
     mediaRecorder.stop()
 
     mediaRecorder.onstop = function(e) {
-        blob = new Blob(audioData, {type: "audio/ogg; codecs=opus"})
-        const audioURL = window.URL.createObjectURL(blob)
+        const scoreId = button.id.split("_")[0]
+        blobs[scoreId] = new Blob(audioData, {type: "audio/ogg; codecs=opus"})
+        const audioURL = window.URL.createObjectURL(blobs[scoreId])
 
         const playButton = parentTd.querySelector("[id$='_play']")
         playButton.dataset.url = audioURL
@@ -210,49 +212,49 @@ function pauseAudio(button) {
     enableButtons()
 }
 
-function submitForm(button) {
-    const scoreId = button.id.split("_")[0]
-    const form = document.getElementById(`${scoreId}_form`)
-
-    const formData = new FormData(form)
-
-    if (blob) {
-        formData.append("score_feedback", blob)
+async function submitForm(button) {
+    const table = document.getElementById("scoreTable")
+    for (const scoreId of pendingScores) {
+        await queueScore(scoreId, document.getElementById(`${scoreId}_input`).value, blobs[scoreId])
+        delete blobs[scoreId]
     }
+    pendingScores.clear()
+
+    try {
+        await syncScores(table.dataset.syncUrl)
+        window.location.replace(window.location.href)
+    } catch (e) {
+        // Keep the queued scores until the connection is back.
+        button.classList.replace("btn-success", "btn-warning")
+        button.innerHTML = '<i class="bi bi-cloud-slash"></i>'
+    }
+}
 
-    // Get current URL
-    const url = window.location.href
-    fetch(url, {
-        method: "POST",
-        mode: "no-cors",
-        body: formData,
-    }).then(response => {
-        console.log('response')
-        console.log(response)
-        if (response.status === 200) {
-            window.location.replace(url)
+async function flushQueuedScores() {
+    const table = document.getElementById("scoreTable")
+    if (!table || !navigator.onLine) return
+    try {
+        const results = await syncScores(table.dataset.syncUrl)
+        const changes = await getScoreChanges(table.dataset.syncUrl)
+        if (Object.keys(results).length || changes.length) {
+            window.location.replace(window.location.href)
         }
-    })
-    .catch(e => {
-        console.log('error')
-        console.log(e)
-    })
+    } catch {
+        // Queued changes are kept and retried on the next load or reconnection.
+    }
 }
 
+window.addEventListener("online", flushQueuedScores)
+window.addEventListener("load", flushQueuedScores)
+
 function getSubmitButton(element) {
     const scoreId = element.id.split("_")[0]
-    const actionsSpan = document.getElementById(`${scoreId}_actions`)
-    var submitButton = document.getElementById(`${scoreId}_submit`)
+    pendingScores.add(scoreId)
 
-    if (_submitButton && _submitButton != submitButton) {
-        // Show modal if a submit button already exists.
-        if (!alertModal) {
-            alertModal = new bootstrap.Modal(document.getElementById("alertModal"), {})
-        }
-        alertModal.show()
-        return false
-    } else if (!submitButton) {
-        submitButton = document.createElement("button")
+    // A single submit button saves every changed score of the page.
+    if (!_submitButton) {
+        const actionsSpan = document.getElementById(`${scoreId}_actions`)
+        const submitButton = document.createElement("button")
         submitButton.type = "button"
         submitButton.id = `${scoreId}_submit`
         submitButton.setAttribute("onclick", "submitForm(this)")
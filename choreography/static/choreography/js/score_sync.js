@@ -0,0 +1,82 @@
+// Score changes are queued in IndexedDB and kept until the server answers them, so
+// scores and feedback recordings made without connection are synced later.
+const SYNC_DATABASE = "on_stage_scores"
+const SYNC_STORE = "operations"
+const SYNC_CURSOR = "on_stage_scores_cursor"
+
+function openSyncDatabase() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(SYNC_DATABASE, 1)
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(SYNC_STORE, {keyPath: "key"})
+        }
+        request.onsuccess = () => resolve(request.result)
+        request.onerror = () => reject(request.error)
+    })
+}
+
+async function useSyncStore(mode, callback) {
+    const database = await openSyncDatabase()
+    return new Promise((resolve, reject) => {
+        const transaction = database.transaction(SYNC_STORE, mode)
+        const request = callback(transaction.objectStore(SYNC_STORE))
+        transaction.oncomplete = () => resolve(request ? request.result : undefined)
+        transaction.onerror = () => reject(transaction.error)
+    })
+}
+
+function queueScore(scoreId, value, feedback) {
+    return useSyncStore("readwrite", store => store.put({
+        key: crypto.randomUUID(),
+        score: Number(scoreId),
+        value: value,
+        feedback: feedback || null,
+        recorded: new Date().toISOString(),
+    }))
+}
+
+function getQueuedScores() {
+    return useSyncStore("readonly", store => store.getAll())
+}
+
+async function syncScores(url) {
+    const operations = await getQueuedScores()
+    if (!operations.length) return {}
+
+    const formData = new FormData()
+    formData.append("csrfmiddlewaretoken", document.querySelector("[name=csrfmiddlewaretoken]").value)
+    formData.append("operations", JSON.stringify(operations.map(operation => ({
+        ...operation,
+        feedback: Boolean(operation.feedback),
+    }))))
+    for (const operation of operations) {
+        if (operation.feedback) {
+            formData.append(`feedback_${operation.key}`, operation.feedback, `${operation.key}.ogg`)
+        }
+    }
+
+    const response = await fetch(url, {method: "POST", body: formData})
+    if (!response.ok) throw new Error(response.statusText)
+    const {results} = await response.json()
+
+    // Every answered operation is final, whether it was applied or rejected.
+    await useSyncStore("readwrite", store => {
+        for (const key in results) {
+            store.delete(key)
+        }
+    })
+    return results
+}
+
+async function getScoreChanges(url) {
+    // The first request only sets the cursor, as the page already shows every score.
+    const cursor = localStorage.getItem(`${SYNC_CURSOR}_${url}`)
+    const query = cursor ? `?since=${encodeURIComponent(cursor)}` : ""
+    const response = await fetch(url + query)
+    if (!response.ok) throw new Error(response.statusText)
+    const changes = await response.json()
+    if (changes.cursor) {
+        localStorage.setItem(`${SYNC_CURSOR}_${url}`, changes.cursor)
+    }
+    return cursor ? changes.scores : []
+}
@@ -0,0 +1,54 @@
+// Each peaks file holds an int8 minimum and maximum for every 10 ms of audio.
+const PEAKS_PER_SECOND = 100
+
+function drawWaveform(canvas, peaks, progress = 0) {
+    const context = canvas.getContext("2d")
+    const width = canvas.width
+    const height = canvas.height
+    const buckets = peaks.length / 2
+    const style = getComputedStyle(canvas)
+    context.clearRect(0, 0, width, height)
+
+    for (let x = 0; x < width; x++) {
+        // Merge the buckets drawn on the same pixel column.
+        const start = Math.floor(x * buckets / width)
+        const end = Math.max(start + 1, Math.floor((x + 1) * buckets / width))
+        let min = 0
+        let max = 0
+        for (let bucket = start; bucket < end && bucket < buckets; bucket++) {
+            min = Math.min(min, peaks[bucket * 2])
+            max = Math.max(max, peaks[bucket * 2 + 1])
+        }
+        context.fillStyle = x / width < progress ? style.getPropertyValue("--bs-primary") : style.getPropertyValue("--bs-secondary")
+        const top = height / 2 - max / 128 * height / 2
+        const bottom = height / 2 - min / 128 * height / 2
+        context.fillRect(x, top, 1, Math.max(1, bottom - top))
+    }
+}
+
+async function attachWaveform(canvas, audio) {
+    const response = await fetch(canvas.dataset.peaksUrl)
+    if (!response.ok) {
+        // Peaks are rendered in the background, so they may not be ready yet.
+        canvas.remove()
+        return
+    }
+    const peaks = new Int8Array(await response.arrayBuffer())
+    const duration = peaks.length / 2 / PEAKS_PER_SECOND
+    drawWaveform(canvas, peaks)
+
+    canvas.addEventListener("click", (event) => {
+        const position = event.offsetX / canvas.clientWidth
+        audio.currentTime = position * (audio.duration || duration)
+        audio.play()
+    })
+    audio.addEventListener("timeupdate", () => {
+        drawWaveform(canvas, peaks, audio.currentTime / (audio.duration || duration))
+    })
+}
+
+for (const canvas of document.querySelectorAll("canvas[data-peaks-url][data-audio-url]")) {
+    const audio = new Audio(canvas.dataset.audioUrl)
+    audio.preload = "none"
+    attachWaveform(canvas, audio)
+}
@@ -1,16 +1,32 @@
+from datetime import date, timedelta
+
 from celery import Task, shared_task, states
 from celery.exceptions import NotRegistered
 from celery.utils.log import get_task_logger
+from django.conf import settings
 from django.core.mail import send_mail
 from django.utils import timezone
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
 
-from choreography.models import Choreography
-from event.models import Price
+from choreography.awards import recompute_default_award
+from choreography.feedback import compress_feedback_audio
+from choreography.models import Choreography, TrackStatusChoices
+from choreography.normalization import normalize_event_scores
+from choreography.pricing import get_price_transitions, reprice_choreographies
+from choreography.shows import render_show
+from choreography.tracks import (
+    ingest_music_track,
+    rename_music_tracks,
+    transcode_music_tracks,
+)
+from choreography.waveforms import render_peaks_by_pk
 
 logger = get_task_logger(__name__)
 
+# How far ahead price transitions are scheduled on each run.
+PRICE_TRANSITIONS_HORIZON = timedelta(hours=settings.PRICE_TRANSITIONS_HORIZON)
+
 
 class BaseTaskWithRetry(Task):
     autoretry_for = (NotRegistered, KeyError, Exception)
@@ -43,33 +59,15 @@ def send_confirmation_email_task(
 
 @shared_task(bind=True, base=BaseTaskWithRetry, name="update_choreography_price")
 def update_choreography_price(self):
-    updated = 0
-    choreographies_qs = Choreography.objects.filter(
-        event__end_date__gte=timezone.now().date()
-    )
-    if choreographies_qs.exists():
-        no_deposit_choreographies_pk = [
-            choreography.id
-            for choreography in choreographies_qs
-            if not choreography.deposit_paid
-        ]
-        no_deposit_choreographies_qs = choreographies_qs.filter(
-            id__in=no_deposit_choreographies_pk
+    report = reprice_choreographies()
+    updated = len(report)
+    for change in report:
+        logger.info(
+            _(
+                "Choreography %(choreography)s price changed from $ %(old_amount)s to $ %(new_amount)s."
+            )
+            % change
         )
-        if no_deposit_choreographies_qs.exists():
-            for choreography in no_deposit_choreographies_qs:
-                price = (
-                    Price.objects.filter(
-                        event=choreography.event,
-                        category_type=choreography.category.type,
-                        due_date__gte=timezone.now().date(),
-                    )
-                    .order_by("due_date")
-                    .first()
-                )
-                choreography.price = price
-                choreography.save()
-                updated += 1
 
     if updated:
         message = ngettext(
@@ -86,3 +84,175 @@ def update_choreography_price(self):
             meta=_("No choreography price was updated today."),
         )
         logger.info(_("No choreography price was updated today."))
+
+    return report
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="reprice_partition")
+def reprice_partition(self, event_pk, category_type):
+    report = reprice_choreographies(
+        Choreography.objects.filter(event_id=event_pk, category__type=category_type)
+    )
+    message = ngettext(
+        "Successfully updated %(count)d choreography price!",
+        "Successfully updated %(count)d choreographies price!",
+        len(report),
+    ) % {"count": len(report)}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return report
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="schedule_price_transitions")
+def schedule_price_transitions(self, event_pk=None):
+    now = timezone.now()
+    transitions = get_price_transitions(now, now + PRICE_TRANSITIONS_HORIZON, event_pk)
+    scheduled = 0
+    for instant, partitions in transitions.items():
+        for partition in partitions:
+            reprice_partition.apply_async(partition, eta=instant)
+            scheduled += 1
+
+    message = ngettext(
+        "Scheduled %(count)d price transition.",
+        "Scheduled %(count)d price transitions.",
+        scheduled,
+    ) % {"count": scheduled}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="reprice_past_price_transitions")
+def reprice_past_price_transitions(self):
+    now = timezone.now()
+    transitions = get_price_transitions(now - timedelta(days=1), now)
+    partitions = set().union(*transitions.values())
+    for partition in partitions:
+        reprice_partition.delay(*partition)
+
+    message = ngettext(
+        "Repriced %(count)d past price transition.",
+        "Repriced %(count)d past price transitions.",
+        len(partitions),
+    ) % {"count": len(partitions)}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="process_music_track")
+def process_music_track(self, choreography_pk):
+    status = ingest_music_track(choreography_pk)
+    if status == TrackStatusChoices.FAILED:
+        message = _("Choreography %(pk)s music track is not a valid audio file.") % {
+            "pk": choreography_pk
+        }
+    else:
+        message = _("Choreography %(pk)s music track processed.") % {
+            "pk": choreography_pk
+        }
+        transcode_music_tracks_task.delay([choreography_pk])
+        render_waveform_peaks_task.delay("choreography", choreography_pk)
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return status
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="rename_music_tracks")
+def rename_music_tracks_task(self, choreography_pks):
+    renamed, collisions = rename_music_tracks(choreography_pks)
+    for choreography_pk in collisions:
+        logger.warning(
+            _("Choreography %(pk)s music track was not renamed, its new name is taken.")
+            % {"pk": choreography_pk}
+        )
+    message = ngettext(
+        "Renamed %(count)d music track.",
+        "Renamed %(count)d music tracks.",
+        renamed,
+    ) % {"count": renamed}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return renamed
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="render_show")
+def render_show_task(self, event_pk, show_date):
+    cues = render_show(event_pk, date.fromisoformat(show_date))
+    message = ngettext(
+        "Rendered the %(date)s show with %(count)d music track.",
+        "Rendered the %(date)s show with %(count)d music tracks.",
+        len(cues),
+    ) % {"date": show_date, "count": len(cues)}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return cues
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="transcode_music_tracks")
+def transcode_music_tracks_task(self, choreography_pks):
+    transcoded = len(list(filter(None, transcode_music_tracks(choreography_pks))))
+    message = ngettext(
+        "Transcoded %(count)d music track.",
+        "Transcoded %(count)d music tracks.",
+        transcoded,
+    ) % {"count": transcoded}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return transcoded
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="compress_feedback_audio")
+def compress_feedback_audio_task(self, feedback_pk):
+    new_name = compress_feedback_audio(feedback_pk)
+    render_waveform_peaks_task.delay("feedback", feedback_pk)
+    if new_name:
+        message = _("Feedback %(pk)s audio file compressed.") % {"pk": feedback_pk}
+    else:
+        message = _("Feedback %(pk)s audio file was left unchanged.") % {
+            "pk": feedback_pk
+        }
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return new_name
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="render_waveform_peaks")
+def render_waveform_peaks_task(self, model_name, pk):
+    name = render_peaks_by_pk(model_name, pk)
+    if name:
+        message = _("Rendered %(model)s %(pk)s waveform peaks.") % {
+            "model": model_name,
+            "pk": pk,
+        }
+    else:
+        message = _("%(model)s %(pk)s has no audio file to render.") % {
+            "model": model_name,
+            "pk": pk,
+        }
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return name
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="recompute_award")
+def recompute_award_task(self, choreography_pk):
+    award_type_pk = recompute_default_award(choreography_pk)
+    message = _("Choreography %(pk)s default award recomputed.") % {
+        "pk": choreography_pk
+    }
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return award_type_pk
+
+
+@shared_task(bind=True, base=BaseTaskWithRetry, name="normalize_scores")
+def normalize_scores_task(self, event_pk):
+    normalized = normalize_event_scores(event_pk)
+    message = ngettext(
+        "Normalized the scores of %(count)d choreography of event %(pk)s.",
+        "Normalized the scores of %(count)d choreographies of event %(pk)s.",
+        normalized,
+    ) % {"count": normalized, "pk": event_pk}
+    self.update_state(state=states.SUCCESS, meta=message)
+    logger.info(message)
+    return normalized
@@ -1,16 +1,54 @@
+import json
 import os
 import shutil
-from datetime import date, timedelta
+import struct
+import tempfile
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
+import numpy as np
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
 from academy.models import Academy, Dancer, Professor
-from choreography.models import Choreography, Discount, Payment, Score
+from choreography.audio import compute_peaks, get_audio_duration
+from choreography.awards import AwardTypeIndex, recompute_default_award
+from choreography.feedback import compress_feedback_audio
+from choreography.models import (
+    Choreography,
+    Discount,
+    Feedback,
+    Payment,
+    Score,
+    TrackStatusChoices,
+    track_path,
+)
+from choreography.normalization import (
+    get_trimmed_averages,
+    get_zscore_averages,
+    normalize_event_scores,
+)
+from choreography.pricing import (
+    PriceResolver,
+    get_price_transitions,
+    reprice_choreographies,
+)
+from choreography.rankings import CategoryRanking
+from choreography.shows import build_cue_index, render_ffmetadata
+from choreography.tasks import reprice_past_price_transitions
+from choreography.tracks import (
+    MUSIC_TRACK_JOURNAL_DIR,
+    ingest_music_track,
+    rename_music_tracks,
+)
 from event.models import AwardType, Category, Contact, DanceMode, Event, Price, Schedule
 
 OSUser = get_user_model()
@@ -228,3 +266,684 @@ class ScoreModelTest(ModuleBaseData):
         award = self.choreography.awards.get(assigned_by=self.admin)
         award.refresh_from_db()
         self.assertEqual(award.award_type, self.test_silver_award)
+
+
+class AwardBaseData(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.gold_award = AwardType.objects.create(
+            name="Test gold award", min_average_score=90, max_average_score=100
+        )
+        self.silver_award = AwardType.objects.create(
+            name="Test silver award", min_average_score=70, max_average_score=89
+        )
+        self.event.award_types.add(self.gold_award, self.silver_award)
+        self.default_award = self.choreography.awards.get(assigned_by=self.admin)
+
+
+class AwardEngineTest(AwardBaseData):
+    def test_award_type_index_lookup(self):
+        # Check that scores outside every range get the default award type.
+        index = AwardTypeIndex(self.event.pk)
+        self.assertEqual(index.get_award_type_pk(95), self.gold_award.pk)
+        self.assertEqual(index.get_award_type_pk(89), self.silver_award.pk)
+        self.assertEqual(
+            index.get_award_type_pk(89.5), self.default_award.award_type_id
+        )
+        self.assertEqual(index.get_award_type_pk(50), self.default_award.award_type_id)
+
+    def test_award_type_index_invalidation(self):
+        # Check that the cached index is dropped when an award type changes.
+        index = AwardTypeIndex(self.event.pk)
+        self.assertEqual(
+            index.get_award_type_pk(89.5), self.default_award.award_type_id
+        )
+        self.silver_award.max_average_score = 90
+        self.silver_award.save()
+        self.assertEqual(index.get_award_type_pk(89.5), self.silver_award.pk)
+        self.event.award_types.remove(self.silver_award)
+        self.assertEqual(
+            index.get_award_type_pk(89.5), self.default_award.award_type_id
+        )
+
+    def test_running_score_columns(self):
+        # Check that score changes and deletions keep the running columns up to date.
+        score = Score.objects.create(
+            choreography=self.choreography, judge=self.user, value=95
+        )
+        Score.objects.create(choreography=self.choreography, judge=self.admin)
+        score.value = 75
+        score.save()
+        self.choreography.refresh_from_db()
+        self.assertEqual(
+            (self.choreography.score_total, self.choreography.score_count), (75, 1)
+        )
+        self.default_award.refresh_from_db()
+        self.assertEqual(self.default_award.award_type, self.silver_award)
+
+        # Check that outdated instances don't skew the running columns.
+        first, second = Score.objects.get(pk=score.pk), Score.objects.get(pk=score.pk)
+        first.value = 60
+        first.save()
+        second.value = 70
+        second.save()
+        self.choreography.refresh_from_db()
+        self.assertEqual(
+            (self.choreography.score_total, self.choreography.score_count), (70, 1)
+        )
+
+        score.delete()
+        self.choreography.refresh_from_db()
+        self.assertEqual(
+            (self.choreography.score_total, self.choreography.score_count), (0, 0)
+        )
+
+        # Check that rebuilding the ledger recomputes the same columns.
+        Choreography.objects.update(score_total=10, score_count=3)
+        Choreography.objects.update_ledger()
+        self.choreography.refresh_from_db()
+        self.assertEqual(
+            (self.choreography.score_total, self.choreography.score_count), (0, 0)
+        )
+
+
+@override_settings(AWARD_RECOMPUTE_DELAY=5)
+class AwardRecomputeTest(AwardBaseData):
+    def test_score_changes_are_coalesced(self):
+        # Check that a burst of score changes queues a single deferred recompute.
+        with mock.patch("choreography.scoring.recompute_award_task") as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                score = Score.objects.create(
+                    choreography=self.choreography, judge=self.user, value=95
+                )
+            for value in [80, 75]:
+                with self.captureOnCommitCallbacks(execute=True):
+                    score.value = value
+                    score.save()
+        task.apply_async.assert_called_once_with((self.choreography.pk,), countdown=5)
+        self.default_award.refresh_from_db()
+        self.assertNotEqual(self.default_award.award_type, self.silver_award)
+
+        # Check that the recompute applies the last score and clears the flag.
+        recompute_default_award(self.choreography.pk)
+        self.default_award.refresh_from_db()
+        self.assertEqual(self.default_award.award_type, self.silver_award)
+        self.choreography.refresh_from_db()
+        self.assertIsNone(self.choreography.award_recompute_date)
+
+    def test_replay_pending_recomputes(self):
+        # Check that the command recomputes the awards of flagged choreographies.
+        with mock.patch("choreography.scoring.recompute_award_task"):
+            Score.objects.create(
+                choreography=self.choreography, judge=self.user, value=95
+            )
+        out = StringIO()
+        call_command("replay_award_recomputes", stdout=out)
+        self.assertIn("1 default awards", out.getvalue())
+        self.default_award.refresh_from_db()
+        self.assertEqual(self.default_award.award_type, self.gold_award)
+
+
+class ScoreNormalizationTest(AwardBaseData):
+    def test_normalized_averages(self):
+        # Check that every judge's scores are rescaled to the spread of all scores.
+        matrix = np.array([[60, 80], [90, 100]], dtype=float)
+        np.testing.assert_allclose(
+            get_zscore_averages(matrix), [67.71, 97.29], atol=0.01
+        )
+
+        # Check that only choreographies with enough scores are trimmed.
+        matrix = np.array([[90, 50], [80, np.nan], [70, 60], [10, np.nan]])
+        np.testing.assert_allclose(get_trimmed_averages(matrix, 1), [75, 55])
+
+    @override_settings(SCORE_NORMALIZATION="trimmed")
+    def test_awards_use_normalized_average(self):
+        # Check that score changes normalize the event and move the default award.
+        judge = OSUser.objects.create_user(email="judge@test.com", password="123456")
+        with mock.patch(
+            "choreography.scoring.normalize_event_scores",
+            side_effect=normalize_event_scores,
+        ) as normalize:
+            with self.captureOnCommitCallbacks(execute=True):
+                for user, value in zip([self.admin, self.user, judge], [100, 95, 40]):
+                    Score.objects.create(
+                        choreography=self.choreography, judge=user, value=value
+                    )
+                # Check that nothing is normalized before the scores are committed.
+                normalize.assert_not_called()
+        # Check that the changes of a transaction are normalized once.
+        normalize.assert_called_once_with(self.event.pk)
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.normalized_average, 95)
+        self.assertIsNone(self.choreography.award_recompute_date)
+        self.default_award.refresh_from_db()
+        self.assertEqual(self.default_award.award_type, self.gold_award)
+
+        # Check that rankings follow the same average as awards.
+        choreography = Choreography.objects.create(**self.test_data)
+        Score.objects.create(choreography=choreography, judge=self.user, value=90)
+        Choreography.objects.filter(pk=choreography.pk).update(normalized_average=90)
+        cache.clear()
+        self.assertEqual(
+            CategoryRanking(self.event.pk).get_placement(self.choreography.pk), (1, 2)
+        )
+
+    def test_normalize_scores_command(self):
+        # Check that normalized averages can be written without moving the awards.
+        Score.objects.create(choreography=self.choreography, judge=self.user, value=75)
+        out = StringIO()
+        call_command("normalize_scores", "--mode", "zscore", stdout=out)
+        self.assertIn("1 choreographies", out.getvalue())
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.normalized_average, 75)
+        self.default_award.refresh_from_db()
+        self.assertEqual(self.default_award.award_type, self.silver_award)
+
+        # Check that pending award recomputes are kept for replay.
+        Choreography.objects.update(award_recompute_date=timezone.now())
+        call_command("normalize_scores", "--mode", "trimmed", stdout=out)
+        self.choreography.refresh_from_db()
+        self.assertIsNotNone(self.choreography.award_recompute_date)
+
+
+class CategoryRankingTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.choreographies = [self.choreography]
+        for name in ["Test choreography 2", "Test choreography 3", "Unscored"]:
+            self.choreographies.append(
+                Choreography.objects.create(**{**self.test_data, "name": name})
+            )
+        self.scores = [
+            Score.objects.create(
+                choreography=choreography, judge=self.user, value=value
+            )
+            for choreography, value in zip(self.choreographies, [90, 90, 80])
+        ]
+
+    def test_placements(self):
+        # Check that ties share a place and unscored entries are not ranked.
+        first, second, third, unscored = [c.pk for c in self.choreographies]
+        ranking = CategoryRanking(self.event.pk)
+        self.assertEqual(
+            ranking.get_placements(),
+            {first: (1, 3), second: (1, 3), third: (3, 3)},
+        )
+        self.assertIsNone(ranking.get_placement(unscored))
+
+    def test_ranking_invalidation(self):
+        # Check that score changes and disqualifications drop the cached ranking.
+        ranking = CategoryRanking(self.event.pk)
+        ranking.get_placements()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.scores[2].value = 95
+            self.scores[2].save()
+            # Check that placements cached before the commit are dropped as well.
+            ranking.get_placements()
+        self.assertEqual(ranking.get_placement(self.choreographies[2].pk), (1, 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.choreographies[2].is_disqualified = True
+            self.choreographies[2].save()
+        self.assertEqual(ranking.get_placement(self.choreographies[0].pk), (1, 2))
+        self.assertIsNone(ranking.get_placement(self.choreographies[2].pk))
+
+
+class ChoreographyQuerySetTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        Discount.objects.create(choreography=self.choreography, amount=30)
+        Payment.objects.create(choreography=self.choreography, amount=20)
+
+    def test_with_financials_annotations(self):
+        # Check that annotated amounts match the ones computed by the instance properties.
+        with self.assertNumQueries(1):
+            choreography = Choreography.objects.with_financials().get(
+                pk=self.choreography.pk
+            )
+            self.assertEqual(choreography.dancer_count, 1)
+            self.assertEqual(choreography.discount_amount, 30)
+            self.assertEqual(choreography.paid_amount, 20)
+            self.assertEqual(choreography.total_price, 70)
+            self.assertEqual(choreography.deposit_amount, 35)
+            self.assertEqual(choreography.balance, 50)
+            self.assertFalse(choreography.deposit_paid)
+
+        self.assertEqual(choreography.total_price, self.choreography.total_price)
+        self.assertEqual(choreography.balance, self.choreography.balance)
+
+    def test_ledger_signals(self):
+        # Check that the ledger columns follow dancers, discounts, payments and price changes.
+        self.assertEqual(self.choreography.balance, 50)
+        dancer = Dancer.objects.create(
+            academy=self.academy,
+            first_name="other",
+            last_name="dancer",
+            birth_date=date(2000, 8, 13),
+            identification_type="ID",
+            identification_number="87654321",
+        )
+        self.choreography.dancers.add(dancer)
+        self.assertEqual(self.choreography.dancer_count, 2)
+        self.assertEqual(self.choreography.balance, 150)
+
+        self.price.amount = 200
+        self.price.save()
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.balance, 350)
+
+        dancer.delete()
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.dancer_count, 1)
+        self.assertEqual(self.choreography.balance, 150)
+
+        # Check that moving a discount recomputes the choreography it left.
+        other = Choreography.objects.create(
+            academy=self.academy,
+            event=self.event,
+            dance_mode=self.dance_mode,
+            category=self.category,
+            price=self.price,
+            schedule=self.schedule,
+            name="Other choreography",
+        )
+        discount = Discount.objects.get(choreography=self.choreography)
+        discount.choreography = other
+        discount.save()
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.discount_total, 0)
+        other.refresh_from_db()
+        self.assertEqual(other.discount_total, 30)
+        discount.choreography = self.choreography
+        discount.save()
+        self.choreography.refresh_from_db()
+
+        # Saving without a price change only loads the category and writes the row.
+        with self.assertNumQueries(2):
+            self.choreography.save()
+        self.choreography.price = Price.objects.create(
+            event=self.event,
+            name="Other price",
+            category_type=1,
+            amount=80,
+            due_date=self.event.end_date,
+        )
+        self.choreography.save()
+        self.assertEqual(self.choreography.balance, 30)
+
+    def test_rebuild_ledger_command(self):
+        # Check that the command restores ledger columns that drifted.
+        Choreography.objects.update(dancer_count=0, paid_total=0, balance=0)
+        call_command("rebuild_ledger", stdout=StringIO())
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.dancer_count, 1)
+        self.assertEqual(self.choreography.paid_total, 20)
+        self.assertEqual(self.choreography.balance, 50)
+
+
+class RepricingTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.expired_price = Price.objects.create(
+            event=self.event,
+            name="Expired price",
+            category_type=1,
+            amount=80,
+            due_date=date(2023, 6, 1),
+        )
+        self.choreography.price = self.expired_price
+        self.choreography.save()
+
+    def test_reprice_choreographies(self):
+        # Check that a choreography without its deposit paid gets the current price.
+        self.assertEqual(self.choreography.balance, 80)
+        report = reprice_choreographies()
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]["old_amount"], 80)
+        self.assertEqual(report[0]["new_amount"], 100)
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.price, self.price)
+        self.assertEqual(self.choreography.balance, 100)
+
+        # Check that nothing changes when the price is already the current one.
+        self.assertEqual(reprice_choreographies(), [])
+
+    def test_price_transitions(self):
+        # Check that the transition happens at the midnight after the price due date.
+        since = timezone.make_aware(datetime(2023, 6, 1, 12))
+        transitions = get_price_transitions(since, since + timedelta(days=1))
+        self.assertEqual(
+            transitions,
+            {
+                timezone.make_aware(datetime(2023, 6, 2)): {
+                    (self.event.pk, self.expired_price.category_type)
+                }
+            },
+        )
+        self.assertEqual(
+            get_price_transitions(since + timedelta(days=1), since + timedelta(days=2)),
+            {},
+        )
+
+        # Check that the safety net only reprices the partitions of the past day.
+        with mock.patch(
+            "choreography.tasks.timezone.now", return_value=since + timedelta(hours=12)
+        ), mock.patch("choreography.tasks.reprice_partition.delay") as delay:
+            reprice_past_price_transitions.apply()
+        delay.assert_called_once_with(self.event.pk, self.expired_price.category_type)
+
+    def test_price_resolver(self):
+        # Check that the current price and next due date are resolved from the cache.
+        resolver = PriceResolver(self.event)
+        self.assertEqual(
+            resolver.get_current_price(1, date(2023, 5, 1)), self.expired_price
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.get_current_price(1), self.price)
+            self.assertIsNone(resolver.get_current_price(2))
+            self.assertEqual(resolver.get_next_due_date(1), self.event.end_date)
+            self.assertEqual(
+                resolver.get_next_due_date(1, date(2051, 1, 1)), self.event.end_date
+            )
+
+        # Check that saving a price drops the cached timeline.
+        self.price.amount = 120
+        self.price.save()
+        self.assertEqual(resolver.get_current_price(1).amount, 120)
+
+    def test_deposit_paid_choreography_keeps_its_price(self):
+        # Check that a choreography with its deposit paid is not repriced.
+        Payment.objects.create(choreography=self.choreography, amount=40)
+        self.assertEqual(reprice_choreographies(), [])
+        self.choreography.refresh_from_db()
+        self.assertEqual(self.choreography.price, self.expired_price)
+
+
+class AudioDurationTest(TestCase):
+    def mp3_frame(self, body=b""):
+        # MPEG1 Layer III, 128 kbps, 44.1 kHz, stereo: 417 bytes per frame.
+        return (b"\xff\xfb\x90\x00" + body).ljust(417, b"\x00")
+
+    def test_wav_duration_from_header(self):
+        # Check that the duration is read from the RIFF header of a WAV file.
+        header = b"RIFF\x24\x58\x01\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x44\xAC\x00\x00\x88\x58\x01\x00\x02\x00\x10\x00data\x88\x58\x01\x00"
+        test_file = SimpleUploadedFile("test_file.wav", header + b"\x00" * 88200)
+        self.assertEqual(get_audio_duration(test_file), timedelta(seconds=1))
+
+    def test_cbr_mp3_duration_from_bitrate(self):
+        # Check that a constant bitrate MP3 duration is computed from its size.
+        id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+        test_file = SimpleUploadedFile("test_file.mp3", id3 + self.mp3_frame() * 10)
+        self.assertAlmostEqual(
+            get_audio_duration(test_file).total_seconds(), 4170 * 8 / 128000, places=5
+        )
+
+    def test_vbr_mp3_duration_from_xing_header(self):
+        # Check that the frame count of the Xing header is used for the duration.
+        xing = b"\x00" * 32 + b"Xing\x00\x00\x00\x01\x00\x00\x00\x64"
+        test_file = SimpleUploadedFile(
+            "test_file.mp3", self.mp3_frame(xing) + self.mp3_frame() * 2
+        )
+        self.assertAlmostEqual(
+            get_audio_duration(test_file).total_seconds(),
+            100 * 1152 / 44100,
+            places=5,
+        )
+
+
+class WaveformPeaksTest(TestCase):
+    def test_peaks_per_bucket(self):
+        # Check that every bucket keeps its minimum and maximum scaled to 8 bits.
+        pcm = struct.pack("<6h", -32768, 256, 1000, -512, 32767, 0)
+        self.assertEqual(
+            struct.unpack("<6b", compute_peaks(pcm, bucket_size=2)),
+            (-128, 1, -2, 3, 0, 127),
+        )
+
+    def test_last_bucket_is_padded(self):
+        # Check that an incomplete last bucket is padded with silence.
+        pcm = struct.pack("<3h", 1024, 2048, -4096)
+        self.assertEqual(
+            struct.unpack("<4b", compute_peaks(pcm, bucket_size=2)), (4, 8, -16, 0)
+        )
+
+
+class MusicTrackIngestionTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.wav_content = (
+            b"RIFF\x24\x58\x01\x00WAVEfmt \x10\x00\x00\x00\x01\x00\x01\x00\x44\xAC\x00\x00\x88\x58\x01\x00\x02\x00\x10\x00data\x88\x58\x01\x00"
+            + b"\x00" * 88200
+        )
+
+    def tearDown(self):
+        academy_name_snaked = self.academy.name.replace(" ", "_")
+        test_media_folder_path = f"{settings.MEDIA_ROOT}/{academy_name_snaked}/"
+        if os.path.isdir(test_media_folder_path):
+            shutil.rmtree(test_media_folder_path)
+            shutil.rmtree(f"{settings.MEDIA_ROOT}/blobs/", ignore_errors=True)
+            if not any(os.scandir(settings.MEDIA_ROOT)):
+                os.rmdir(settings.MEDIA_ROOT)
+
+    def test_upload_is_processed_later(self):
+        # Check that saving a new music track only flags it for processing.
+        self.choreography.music_track = SimpleUploadedFile(
+            "test_file.wav", self.wav_content
+        )
+        self.choreography.save()
+        self.assertTrue(self.choreography.music_track_processing)
+        self.assertEqual(self.choreography.duration, self.category.max_duration)
+
+        # Check that the ingestion probes the duration and flips the state.
+        status = ingest_music_track(self.choreography.pk)
+        self.choreography.refresh_from_db()
+        self.assertEqual(status, TrackStatusChoices.READY)
+        self.assertEqual(self.choreography.track_status, TrackStatusChoices.READY)
+        self.assertEqual(self.choreography.duration, timedelta(seconds=1))
+        self.assertEqual(
+            self.choreography.music_track,
+            "test_academy/music_track/test_choreography.wav",
+        )
+
+    def test_upload_with_wrong_format(self):
+        # Check that a file whose content does not match its extension is rejected.
+        self.choreography.music_track = SimpleUploadedFile(
+            "test_file.mp3", self.wav_content
+        )
+        self.choreography.save()
+        status = ingest_music_track(self.choreography.pk)
+        self.choreography.refresh_from_db()
+        self.assertEqual(status, TrackStatusChoices.FAILED)
+        self.assertTrue(self.choreography.music_track_failed)
+
+
+class MusicTrackRenameTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.other_choreography = Choreography.objects.create(
+            **{**self.test_data, "name": "Other choreography"}
+        )
+        self.folder = os.path.join(self.media_root, "test_academy", "music_track")
+        os.makedirs(self.folder)
+        for order_number, choreography in enumerate(
+            [self.choreography, self.other_choreography], 1
+        ):
+            choreography.order_number = order_number
+            choreography.save()
+            name = track_path(choreography, "track.wav")
+            with open(os.path.join(self.media_root, name), "w") as track:
+                track.write(choreography.name)
+            Choreography.objects.filter(pk=choreography.pk).update(music_track=name)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def read_track(self, choreography):
+        choreography.refresh_from_db()
+        with open(
+            os.path.join(self.media_root, choreography.music_track.name)
+        ) as track:
+            return track.read()
+
+    def test_swapped_order_numbers(self):
+        # Check that swapping order numbers swaps the files without overwriting them.
+        Choreography.objects.filter(pk=self.choreography.pk).update(order_number=2)
+        Choreography.objects.filter(pk=self.other_choreography.pk).update(
+            order_number=1
+        )
+        renamed, collisions = rename_music_tracks(
+            [self.choreography.pk, self.other_choreography.pk]
+        )
+        self.assertEqual((renamed, collisions), (2, []))
+        self.assertEqual(self.read_track(self.choreography), "Test choreography")
+        self.assertEqual(
+            self.choreography.music_track,
+            "test_academy/music_track/00002_test_choreography.wav",
+        )
+        self.assertEqual(self.read_track(self.other_choreography), "Other choreography")
+        self.assertEqual(
+            sorted(os.listdir(self.folder)),
+            [
+                "00001_other_choreography.wav",
+                "00002_test_choreography.wav",
+            ],
+        )
+
+    def test_colliding_names(self):
+        # Check that two choreographies renamed to the same name are both skipped.
+        Choreography.objects.filter(pk=self.other_choreography.pk).update(
+            name="Test choreography", order_number=1
+        )
+        Choreography.objects.filter(pk=self.choreography.pk).update(order_number=3)
+        Choreography.objects.filter(pk=self.other_choreography.pk).update(
+            order_number=3
+        )
+        renamed, collisions = rename_music_tracks(
+            [self.choreography.pk, self.other_choreography.pk]
+        )
+        self.assertEqual(renamed, 0)
+        self.assertEqual(
+            sorted(collisions), [self.choreography.pk, self.other_choreography.pk]
+        )
+
+    def write_interrupted_journal(self):
+        Choreography.objects.filter(pk=self.choreography.pk).update(order_number=5)
+        old_name = "test_academy/music_track/00001_test_choreography.wav"
+        new_name = "test_academy/music_track/00005_test_choreography.wav"
+        temp_name = f"{old_name}.interrupted.tmp"
+        journal_dir = os.path.join(self.media_root, MUSIC_TRACK_JOURNAL_DIR)
+        os.makedirs(journal_dir)
+        with open(os.path.join(journal_dir, "interrupted.json"), "w") as journal:
+            json.dump(
+                {
+                    "staged": True,
+                    "moves": [[self.choreography.pk, old_name, new_name, temp_name]],
+                },
+                journal,
+            )
+        os.rename(
+            os.path.join(self.media_root, old_name),
+            os.path.join(self.media_root, temp_name),
+        )
+
+    def test_resume_interrupted_run(self):
+        # Check that an interrupted run is completed from its journal.
+        self.write_interrupted_journal()
+        out = StringIO()
+        call_command("recover_track_renames", stdout=out)
+        self.assertIn("Successfully recovered 1 rename journals.", out.getvalue())
+        self.assertEqual(self.read_track(self.choreography), "Test choreography")
+        self.assertEqual(
+            self.choreography.music_track,
+            "test_academy/music_track/00005_test_choreography.wav",
+        )
+
+    def test_rollback_interrupted_run(self):
+        # Check that an interrupted run can be rolled back to the previous names.
+        self.write_interrupted_journal()
+        call_command("recover_track_renames", rollback=True, stdout=StringIO())
+        self.assertEqual(self.read_track(self.choreography), "Test choreography")
+        self.assertEqual(
+            self.choreography.music_track,
+            "test_academy/music_track/00001_test_choreography.wav",
+        )
+
+
+class ShowCueIndexTest(ModuleBaseData):
+    def test_cue_offsets_include_silence_gaps(self):
+        # Check that every choreography starts after the previous ones and their gaps.
+        other_choreography = Choreography.objects.create(
+            **{**self.test_data, "name": "Other; choreography", "order_number": 2}
+        )
+        self.choreography.order_number = 1
+        cues = build_cue_index([self.choreography, other_choreography], [90.5, 60], 5)
+        self.assertEqual([cue["start"] for cue in cues], [0, 95.5])
+        self.assertEqual([cue["order_number"] for cue in cues], [1, 2])
+
+        # Check that chapter titles are escaped in the ffmpeg metadata.
+        metadata = render_ffmetadata(cues)
+        self.assertIn("START=95500\nEND=155500", metadata)
+        self.assertIn("title=00002 test academy - Other\\; choreography", metadata)
+
+
+class FeedbackCompressionTest(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        score = Score.objects.create(
+            choreography=self.choreography, judge=self.user, value=90
+        )
+        self.feedback = Feedback.objects.create(
+            score=score, audio_file=SimpleUploadedFile("recording.webm", b"raw")
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def fake_render(self, source, target):
+        with open(target, "wb") as compressed:
+            compressed.write(b"opus")
+
+    def test_feedback_is_replaced_with_compressed_audio(self):
+        # Check that the compressed file keeps the feedback naming and replaces the upload.
+        original_path = self.feedback.audio_file.path
+        with mock.patch(
+            "choreography.feedback.render_compressed_speech", self.fake_render
+        ):
+            new_name = compress_feedback_audio(self.feedback.pk)
+        self.feedback.refresh_from_db()
+        self.assertEqual(new_name, self.feedback.audio_file.name)
+        self.assertRegex(
+            new_name, r"/feedback/test_choreography/user@test\.com_[0-9a-f]{12}\.ogg$"
+        )
+        self.assertEqual(self.feedback.audio_file.read(), b"opus")
+        self.assertFalse(os.path.exists(original_path))
+
+        # Check that compressed feedback is not processed again.
+        self.assertIsNone(compress_feedback_audio(self.feedback.pk))
+
+    def test_replaced_recording_is_kept(self):
+        # Check that a recording replaced while compressing is left untouched.
+        original_path = self.feedback.audio_file.path
+
+        def replace_and_render(source, target):
+            self.fake_render(source, target)
+            Feedback.objects.filter(pk=self.feedback.pk).update(audio_file="newer.ogg")
+
+        with mock.patch(
+            "choreography.feedback.render_compressed_speech", replace_and_render
+        ):
+            self.assertIsNone(compress_feedback_audio(self.feedback.pk))
+        self.feedback.refresh_from_db()
+        self.assertEqual(self.feedback.audio_file.name, "newer.ogg")
+        stored = [name for _, _, names in os.walk(self.media_root) for name in names]
+        self.assertEqual(stored, [os.path.basename(original_path)])
@@ -1,14 +1,33 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
 from datetime import date, timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
 from django.contrib.messages import get_messages
+from django.core.cache import cache
 from django.db.models import Q
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from academy.models import Academy, Dancer, Professor
 from choreography.forms import ChoreographyForm
-from choreography.models import Choreography
+from choreography.live import format_event, get_channel, get_scoring_progress
+from choreography.models import (
+    Choreography,
+    Payment,
+    Score,
+    playback_path,
+    track_path,
+)
+from choreography.payments import rollback_payment_batches
+from choreography.shows import get_show_name
 from event.models import Category, Contact, DanceMode, Event, Price, Schedule
 
 OSUser = get_user_model()
@@ -437,3 +456,686 @@ class ChoreographyUpdateViewTest(ModuleBaseData):
             self.choreography.get_update_url(), {"dance_mode": ""}
         )
         self.assertContains(response, "This field is required.")
+
+
+class PaymentStateBaseData(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.choreography_list = [
+            Choreography.objects.create(
+                academy=self.academy,
+                event=self.event,
+                dance_mode=self.dance_mode,
+                category=self.category,
+                price=self.price,
+                schedule=self.schedule,
+                name=f"Test choreography {i}",
+            )
+            for i in range(4)
+        ]
+        for choreography, amount in zip(self.choreography_list, [0, 50, 100, 150]):
+            choreography.dancers.add(self.dancer)
+            if amount:
+                Payment.objects.create(choreography=choreography, amount=amount)
+
+        self.changelist_path = reverse("admin:choreography_choreography_changelist")
+        self.client.login(email="admin@test.com", password="123456")
+
+
+class ChoreographyAdminFiltersTest(PaymentStateBaseData):
+    def get_filtered_names(self, **params):
+        response = self.client.get(self.changelist_path, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(
+            choreography.name for choreography in response.context["cl"].queryset
+        )
+
+    def test_payment_state_filters(self):
+        # Check that the fully paid, deposit paid and overpaid filters match the balances.
+        self.assertEqual(
+            self.get_filtered_names(fully_paid="true"), ["Test choreography 2"]
+        )
+        self.assertEqual(
+            self.get_filtered_names(deposit_paid="false"), ["Test choreography 0"]
+        )
+        self.assertEqual(
+            self.get_filtered_names(overpaid="true"), ["Test choreography 3"]
+        )
+        self.assertEqual(
+            self.get_filtered_names(deposit_paid="true", fully_paid="false"),
+            ["Test choreography 1", "Test choreography 3"],
+        )
+
+
+class ManagePaymentsViewTest(PaymentStateBaseData):
+    def test_pay_deposit_amount(self):
+        # Check that only choreographies without the deposit paid get a new payment.
+        response = self.client.post(
+            reverse("manage_payments_view"),
+            {
+                "selected_choreographies_id": ",".join(
+                    str(choreography.pk) for choreography in self.choreography_list
+                ),
+                "payment_method": 1,
+                "payment_date": date.today().strftime("%Y-%m-%d"),
+                "pay_deposit_amount": "",
+            },
+        )
+        self.assertRedirects(
+            response, reverse("admin:choreography_choreography_changelist")
+        )
+        payment = Payment.objects.get(choreography=self.choreography_list[0])
+        self.assertEqual(payment.amount, 50)
+        self.assertIsNotNone(payment.batch)
+        self.choreography_list[0].refresh_from_db()
+        self.assertTrue(self.choreography_list[0].deposit_paid)
+
+        # Check that rolling back the batch removes its payments and restores the balance.
+        rollback_payment_batches([payment.batch])
+        self.choreography_list[0].refresh_from_db()
+        self.assertFalse(self.choreography_list[0].payments.exists())
+        self.assertEqual(self.choreography_list[0].balance, 100)
+
+    def test_pay_balance_amount(self):
+        # Check that a single batch pays every pending balance.
+        self.client.post(
+            reverse("manage_payments_view"),
+            {
+                "selected_choreographies_id": ",".join(
+                    str(choreography.pk) for choreography in self.choreography_list
+                ),
+                "payment_method": 2,
+                "payment_date": date.today().strftime("%Y-%m-%d"),
+                "pay_balance_amount": "",
+            },
+        )
+        batches = Payment.objects.exclude(batch=None).values_list("batch", flat=True)
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(len(set(batches)), 1)
+        self.assertEqual(
+            Choreography.objects.filter(balance__gt=0).count(),
+            0,
+        )
+
+
+class SetOrderNumberViewTest(PaymentStateBaseData):
+    def post_order(self, button, order_numbers):
+        return self.client.post(
+            reverse("set_order_number"),
+            {"choreographies_json": json.dumps(order_numbers), button: ""},
+        )
+
+    def test_set_new_order(self):
+        # Check that only the filled order numbers are written.
+        first, second = self.choreography_list[:2]
+        response = self.post_order(
+            "set_new_order", {str(first.pk): "7", str(second.pk): ""}
+        )
+        self.assertRedirects(response, self.changelist_path)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.order_number, 7)
+        self.assertIsNone(second.order_number)
+
+    def test_set_default_order(self):
+        # Check that active choreographies are numbered consecutively.
+        self.choreography_list[0].order_number = 9
+        self.choreography_list[0].save()
+        response = self.post_order(
+            "set_default_order",
+            {str(choreography.pk): "" for choreography in self.choreography_list},
+        )
+        self.assertRedirects(response, self.changelist_path)
+        self.assertEqual(
+            sorted(
+                Choreography.objects.filter(
+                    pk__in=[choreography.pk for choreography in self.choreography_list]
+                ).values_list("order_number", flat=True)
+            ),
+            [1, 2, 3, 4],
+        )
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn("Successfully updated 4 choreographies order number!", messages)
+
+
+class ShowRankingsActionTest(PaymentStateBaseData):
+    def test_rankings_are_listed_by_place(self):
+        # Check that the selected choreographies are listed from their first place.
+        cache.clear()
+        for choreography, value in zip(self.choreography_list, [70, 90, 80]):
+            Score.objects.create(
+                choreography=choreography, judge=self.admin, value=value
+            )
+        response = self.client.post(
+            self.changelist_path,
+            {
+                "action": "show_rankings",
+                "_selected_action": [c.pk for c in self.choreography_list],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (choreography.name, choreography.placement)
+                for choreography in response.context["choreographies_list"]
+            ],
+            [
+                ("Test choreography 1", (1, 3)),
+                ("Test choreography 2", (2, 3)),
+                ("Test choreography 0", (3, 3)),
+                ("Test choreography 3", None),
+            ],
+        )
+
+
+class MusicTrackBaseData(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.soundman = OSUser.objects.create_user(
+            email="soundman@test.com", password="123456"
+        )
+        self.soundman.groups.add(Group.objects.create(name="Soundman"))
+        for order_number in [2, 1]:
+            choreography = Choreography.objects.create(
+                academy=self.academy,
+                event=self.event,
+                dance_mode=self.dance_mode,
+                category=self.category,
+                price=self.price,
+                schedule=self.schedule,
+                name=f"Test choreography {order_number}",
+                order_number=order_number,
+            )
+            name = track_path(choreography, "track.mp3")
+            os.makedirs(
+                os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True
+            )
+            with open(os.path.join(self.media_root, name), "wb") as track:
+                track.write(choreography.name.encode())
+            Choreography.objects.filter(pk=choreography.pk).update(music_track=name)
+        self.download_path = reverse(
+            "music_download", kwargs={"event_pk": self.event.pk}
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+
+class MusicDownloadViewTest(MusicTrackBaseData):
+    def test_download_requires_soundman(self):
+        # Check that users outside the Soundman group cannot download the tracks.
+        self.client.login(email="user@test.com", password="123456")
+        response = self.client.get(self.download_path)
+        self.assertEqual(response.status_code, 302)
+
+    def test_download_playlist(self):
+        # Check that the ZIP archive holds the ordered tracks and cue sheets.
+        self.client.login(email="soundman@test.com", password="123456")
+        response = self.client.get(
+            self.download_path, {"schedule_filter": self.schedule.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        folder = self.schedule.date.isoformat()
+        self.assertEqual(
+            archive.namelist(),
+            [
+                f"{folder}/playlist.m3u",
+                f"{folder}/cue_sheet.csv",
+                f"{folder}/00001_test_choreography_1.mp3",
+                f"{folder}/00002_test_choreography_2.mp3",
+            ],
+        )
+        self.assertEqual(
+            archive.read(f"{folder}/00002_test_choreography_2.mp3"),
+            b"Test choreography 2",
+        )
+        playlist = archive.read(f"{folder}/playlist.m3u").decode().splitlines()
+        self.assertEqual(
+            playlist[2::2],
+            ["00001_test_choreography_1.mp3", "00002_test_choreography_2.mp3"],
+        )
+
+    def test_download_file_name_is_encoded(self):
+        # Check that quotes and accents in the event name keep the header valid.
+        Event.objects.filter(pk=self.event.pk).update(name='Gala "Córdoba"')
+        self.client.login(email="soundman@test.com", password="123456")
+        response = self.client.get(self.download_path)
+        self.assertEqual(
+            response["Content-Disposition"],
+            "attachment; filename*=utf-8''Gala%20%22C%C3%B3rdoba%22.zip",
+        )
+
+    def test_download_serves_playback_derivative(self):
+        # Check that the normalized derivative replaces the uploaded music track.
+        content_hash = "ab" * 32
+        derivative = os.path.join(self.media_root, playback_path(content_hash))
+        os.makedirs(os.path.dirname(derivative))
+        with open(derivative, "wb") as track:
+            track.write(b"Normalized")
+        Choreography.objects.filter(order_number=1).update(
+            music_track_hash=content_hash
+        )
+        self.client.login(email="soundman@test.com", password="123456")
+        response = self.client.get(self.download_path)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        folder = self.schedule.date.isoformat()
+        self.assertEqual(
+            archive.read(f"{folder}/00001_test_choreography_1.mp3"), b"Normalized"
+        )
+
+
+class ShowFileViewTest(MusicTrackBaseData):
+    def setUp(self):
+        super().setUp()
+        name = get_show_name(self.event.pk, self.schedule.date)
+        os.makedirs(os.path.dirname(os.path.join(self.media_root, name)))
+        for extension in ["mp3", "json"]:
+            with open(
+                os.path.join(self.media_root, f"{name}.{extension}"), "w"
+            ) as file:
+                file.write(extension)
+        self.show_path = reverse("show_file", kwargs={"schedule_pk": self.schedule.pk})
+
+    def test_show_requires_soundman(self):
+        # Check that users outside the Soundman group cannot download the show.
+        self.client.login(email="user@test.com", password="123456")
+        response = self.client.get(self.show_path)
+        self.assertEqual(response.status_code, 302)
+
+    def test_show_audio_and_cues(self):
+        # Check that the show audio and its cue index are served to soundmen.
+        self.client.login(email="soundman@test.com", password="123456")
+        response = self.client.get(self.show_path)
+        self.assertEqual(b"".join(response.streaming_content), b"mp3")
+        response = self.client.get(self.show_path, {"cues": ""})
+        self.assertEqual(b"".join(response.streaming_content), b"json")
+
+        response = self.client.get(
+            reverse("music_list", kwargs={"event_pk": self.event.pk}),
+            {"schedule_filter": self.schedule.pk},
+        )
+        self.assertContains(response, f"{self.show_path}?cues")
+
+
+class MusicTrackAudioViewTest(MusicTrackBaseData):
+    def setUp(self):
+        super().setUp()
+        self.choreography = Choreography.objects.get(order_number=1)
+        self.audio_path = reverse(
+            "music_track_audio", kwargs={"choreography_pk": self.choreography.pk}
+        )
+        self.client.login(email="user@test.com", password="123456")
+
+    def test_audio_permissions(self):
+        # Check that users outside the academy and without a role are redirected.
+        OSUser.objects.create_user(email="other@test.com", password="123456")
+        self.client.login(email="other@test.com", password="123456")
+        response = self.client.get(self.audio_path)
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+
+    def test_full_and_partial_content(self):
+        # Check that the whole file is served along with its validators.
+        response = self.client.get(self.audio_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"Test choreography 1")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        # Check that byte ranges, including suffix ranges, return partial content.
+        response = self.client.get(self.audio_path, HTTP_RANGE="bytes=5-15")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 5-15/19")
+        self.assertEqual(b"".join(response.streaming_content), b"choreograph")
+        response = self.client.get(self.audio_path, HTTP_RANGE="bytes=-1")
+        self.assertEqual(b"".join(response.streaming_content), b"1")
+
+        # Check that a range past the end of the file can't be satisfied.
+        response = self.client.get(self.audio_path, HTTP_RANGE="bytes=50-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */19")
+
+    def test_missing_file(self):
+        # Check that a track missing from the storage is not found.
+        os.remove(self.choreography.music_track.path)
+        response = self.client.get(self.audio_path)
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_requests(self):
+        # Check that a matching ETag or modification date returns not modified.
+        response = self.client.get(self.audio_path)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        response = self.client.get(self.audio_path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.audio_path, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Check that a stale If-Range validator returns the whole file.
+        response = self.client.get(
+            self.audio_path, HTTP_RANGE="bytes=0-3", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PROTECTED_MEDIA_SERVER="nginx")
+    def test_accel_redirect(self):
+        # Check that the transfer is handed to nginx when configured.
+        response = self.client.get(self.audio_path)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/protected/{self.choreography.music_track.name}",
+        )
+
+        # Check that names with spaces and accents are URL encoded.
+        name = os.path.join(
+            os.path.dirname(self.choreography.music_track.name), "Canción uno.mp3"
+        )
+        os.rename(
+            self.choreography.music_track.path, os.path.join(self.media_root, name)
+        )
+        Choreography.objects.filter(pk=self.choreography.pk).update(music_track=name)
+        response = self.client.get(self.audio_path)
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/protected/{os.path.dirname(name)}/Canci%C3%B3n%20uno.mp3",
+        )
+
+
+class MusicTrackPeaksViewTest(MusicTrackBaseData):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.choreography = Choreography.objects.get(order_number=1)
+        self.peaks_path = reverse(
+            "music_track_peaks", kwargs={"choreography_pk": self.choreography.pk}
+        )
+        self.client.login(email="soundman@test.com", password="123456")
+
+    def test_peaks_permissions(self):
+        # Check that users outside the academy and without a role are redirected.
+        OSUser.objects.create_user(email="other@test.com", password="123456")
+        self.client.login(email="other@test.com", password="123456")
+        response = self.client.get(self.peaks_path)
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+
+    @override_settings(DEBUG=False)
+    def test_missing_peaks_are_queued_once(self):
+        # Check that missing peaks are rendered in the background only once.
+        with mock.patch("choreography.views.render_waveform_peaks_task") as task:
+            self.assertEqual(self.client.get(self.peaks_path).status_code, 404)
+            self.assertEqual(self.client.get(self.peaks_path).status_code, 404)
+        task.delay.assert_called_once_with("choreography", self.choreography.pk)
+
+    def test_missing_track_peaks(self):
+        # Check that the peaks of a track missing from the storage are not found.
+        os.remove(self.choreography.music_track.path)
+        with mock.patch("choreography.views.render_waveform_peaks_task") as task:
+            self.assertEqual(self.client.get(self.peaks_path).status_code, 404)
+        task.delay.assert_not_called()
+
+    def test_current_peaks_are_served(self):
+        # Check that a peaks file newer than the music track is served as is.
+        name = f"peaks/choreography/{self.choreography.pk}.bin"
+        os.makedirs(os.path.join(self.media_root, "peaks/choreography"))
+        with open(os.path.join(self.media_root, name), "wb") as peaks:
+            peaks.write(b"\x80\x7f")
+        track = os.path.join(self.media_root, self.choreography.music_track.name)
+        os.utime(track, (0, 0))
+        response = self.client.get(self.peaks_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"\x80\x7f")
+
+
+class ScoreBaseData(ModuleBaseData):
+    def setUp(self):
+        super().setUp()
+        self.judge = OSUser.objects.create_user(
+            email="judge@test.com", password="123456"
+        )
+        self.judge.groups.add(Group.objects.create(name="Judge"))
+        self.scores = []
+        for name in ["Test choreography 1", "Test choreography 2"]:
+            choreography = Choreography.objects.create(
+                academy=self.academy,
+                event=self.event,
+                dance_mode=self.dance_mode,
+                category=self.category,
+                price=self.price,
+                schedule=self.schedule,
+                name=name,
+            )
+            self.scores.append(
+                Score.objects.create(choreography=choreography, judge=self.judge)
+            )
+        self.client.login(email="judge@test.com", password="123456")
+
+
+class ScoreBatchUpdateViewTest(ScoreBaseData):
+    def setUp(self):
+        super().setUp()
+        self.batch_path = reverse(
+            "score_batch_update", kwargs={"event_pk": self.event.pk}
+        )
+
+    def test_scores_are_saved_at_once(self):
+        # Check that every submitted score is saved and the running columns updated.
+        response = self.client.post(
+            self.batch_path,
+            {f"score_{self.scores[0].pk}": "90", f"score_{self.scores[1].pk}": ""},
+        )
+        self.assertRedirects(
+            response,
+            reverse("score_list", kwargs={"event_pk": self.event.pk}),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(
+            [score.value for score in Score.objects.order_by("pk")], [90, 0]
+        )
+        choreography = self.scores[0].choreography
+        choreography.refresh_from_db()
+        self.assertEqual((choreography.score_total, choreography.score_count), (90, 1))
+
+    def test_locked_scores_reject_the_whole_batch(self):
+        # Check that nothing is saved if any of the submitted scores is locked.
+        Score.objects.filter(pk=self.scores[1].pk).update(is_locked=True)
+        response = self.client.post(
+            self.batch_path,
+            {f"score_{self.scores[0].pk}": "90", f"score_{self.scores[1].pk}": "80"},
+        )
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        self.assertFalse(Score.objects.filter(value__isnull=False).exists())
+
+    def test_invalid_values_are_rejected(self):
+        # Check that out of range values are reported and not saved.
+        response = self.client.post(
+            self.batch_path, {f"score_{self.scores[0].pk}": "101"}
+        )
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn("Score values must be whole numbers between 0 and 100.", messages)
+        self.assertFalse(Score.objects.filter(value__isnull=False).exists())
+
+
+class ScoreListViewTest(ScoreBaseData):
+    def test_invalid_score_pk_is_rejected(self):
+        # Check that a non numeric score is answered with a warning instead of an error.
+        response = self.client.post(
+            reverse("score_list", kwargs={"event_pk": self.event.pk}),
+            {"score_pk": "abc", "score_value": "90"},
+        )
+        self.assertRedirects(response, reverse("home"), fetch_redirect_response=False)
+        self.assertFalse(Score.objects.filter(value__isnull=False).exists())
+
+
+class ScoreSyncViewTest(ScoreBaseData):
+    def setUp(self):
+        super().setUp()
+        self.sync_path = reverse("score_sync", kwargs={"event_pk": self.event.pk})
+
+    def operation(self, score, value, recorded):
+        return {
+            "key": str(uuid.uuid4()),
+            "score": score.pk,
+            "value": value,
+            "recorded": recorded,
+        }
+
+    def sync(self, *operations):
+        response = self.client.post(
+            self.sync_path, {"operations": json.dumps(operations)}
+        )
+        return response.json()["results"]
+
+    def test_operations_are_applied_once(self):
+        # Check that replaying an operation returns its outcome without applying it again.
+        operation = self.operation(self.scores[0], 90, "2050-01-01T10:00:00+00:00")
+        self.assertEqual(self.sync(operation), {operation["key"]: "applied"})
+        Score.objects.filter(pk=self.scores[0].pk).update(value=50)
+        self.assertEqual(self.sync(operation), {operation["key"]: "applied"})
+        self.assertEqual(Score.objects.get(pk=self.scores[0].pk).value, 50)
+
+    def test_conflicts_are_resolved_deterministically(self):
+        # Check that the latest recorded change wins regardless of the sync order.
+        late = self.operation(self.scores[0], 80, "2050-01-01T10:05:00+00:00")
+        early = self.operation(self.scores[0], 70, "2050-01-01T10:00:00+00:00")
+        self.assertEqual(self.sync(late), {late["key"]: "applied"})
+        self.assertEqual(self.sync(early), {early["key"]: "stale"})
+        self.assertEqual(Score.objects.get(pk=self.scores[0].pk).value, 80)
+
+        # Check that locked scores keep the server value.
+        Score.objects.filter(pk=self.scores[1].pk).update(is_locked=True)
+        locked = self.operation(self.scores[1], 60, "2050-01-01T10:10:00+00:00")
+        self.assertEqual(self.sync(locked), {locked["key"]: "locked"})
+        self.assertIsNone(Score.objects.get(pk=self.scores[1].pk).value)
+
+    def test_forbidden_operations_are_answered_alone(self):
+        # Check that an operation on someone else's score doesn't reject the batch.
+        other_score = Score.objects.create(
+            choreography=self.scores[0].choreography,
+            judge=OSUser.objects.create_user(email="other@test.com", password="123456"),
+        )
+        allowed = self.operation(self.scores[0], 90, "2050-01-01T10:00:00+00:00")
+        forbidden = self.operation(other_score, 60, "2050-01-01T10:05:00+00:00")
+        self.assertEqual(
+            self.sync(allowed, forbidden),
+            {allowed["key"]: "applied", forbidden["key"]: "forbidden"},
+        )
+        self.assertEqual(Score.objects.get(pk=self.scores[0].pk).value, 90)
+        self.assertIsNone(Score.objects.get(pk=other_score.pk).value)
+
+    def test_changes_since_cursor(self):
+        # Check that only the scores changed after the cursor are returned.
+        changes = self.client.get(self.sync_path).json()
+        self.assertEqual(len(changes["scores"]), 2)
+        response = self.client.get(self.sync_path, {"since": changes["cursor"]})
+        self.assertEqual(response.json()["scores"], [])
+
+        self.client.get(reverse("lock_scores", kwargs={"event_pk": self.event.pk}))
+        response = self.client.get(self.sync_path, {"since": changes["cursor"]})
+        self.assertTrue(all(score["is_locked"] for score in response.json()["scores"]))
+
+
+class LiveUpdatesTest(ScoreBaseData):
+    def setUp(self):
+        super().setUp()
+        self.live_path = reverse("live_updates", kwargs={"event_pk": self.event.pk})
+        for order_number, score in enumerate(self.scores, 1):
+            Choreography.objects.filter(pk=score.choreography_id).update(
+                order_number=order_number
+            )
+
+    def test_scoring_progress(self):
+        # Check that the order number on stage is the first one missing a score.
+        Score.objects.filter(pk=self.scores[0].pk).update(value=90, is_locked=True)
+        self.assertEqual(
+            get_scoring_progress(self.event.pk),
+            {"total": 2, "scored": 1, "locked": 1, "order_number": 2},
+        )
+
+    def test_live_updates_access(self):
+        # Check that judges can't follow the live updates.
+        response = self.client.get(self.live_path)
+        self.assertEqual(response.status_code, 302)
+
+        # Check that WSGI requests are told to poll the progress instead.
+        self.client.login(email="admin@test.com", password="123456")
+        response = self.client.get(self.live_path)
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(self.live_path, {"poll": ""})
+        self.assertEqual(response.json()["total"], 2)
+
+    @override_settings(LIVE_UPDATES_URL="redis://localhost:6379/0")
+    async def test_live_updates_stream(self):
+        # Check that ASGI requests get the event stream, starting with the progress.
+        async def stream_live_updates(event_pk, progress):
+            yield format_event("progress", progress)
+
+        await self.async_client.alogin(email="admin@test.com", password="123456")
+        with mock.patch("choreography.views.stream_live_updates", stream_live_updates):
+            response = await self.async_client.get(self.live_path)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertTrue(content.startswith(b"event: progress\n"))
+
+    @override_settings(LIVE_UPDATES_URL="redis://localhost:6379/0")
+    @mock.patch("choreography.live.get_redis")
+    def test_updates_are_published_on_commit(self, get_redis):
+        # Check that a batch of synced scores publishes the event progress once.
+        operation = {
+            "key": str(uuid.uuid4()),
+            "score": self.scores[0].pk,
+            "value": 90,
+            "recorded": "2050-01-01T10:00:00+00:00",
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("score_sync", kwargs={"event_pk": self.event.pk}),
+                {"operations": json.dumps([operation])},
+            )
+        publish = get_redis.return_value.publish
+        self.assertEqual(publish.call_count, 1)
+        channel, message = publish.call_args.args
+        self.assertEqual(channel, get_channel(self.event.pk))
+        self.assertEqual(
+            json.loads(message),
+            {
+                "type": "progress",
+                "data": {"total": 2, "scored": 1, "locked": 0, "order_number": 2},
+            },
+        )
+
+
+class LiveAwardUpdatesTest(ModuleBaseData):
+    @override_settings(LIVE_UPDATES_URL="redis://localhost:6379/0")
+    @mock.patch("choreography.live.get_redis")
+    def test_new_choreography_award_is_published(self, get_redis):
+        # Check that the lazily translated default award name is published.
+        with self.captureOnCommitCallbacks(execute=True):
+            choreography = Choreography.objects.create(
+                academy=self.academy,
+                event=self.event,
+                dance_mode=self.dance_mode,
+                category=self.category,
+                price=self.price,
+                schedule=self.schedule,
+                name="Test choreography 3",
+            )
+        messages = [
+            json.loads(call.args[1])
+            for call in get_redis.return_value.publish.call_args_list
+        ]
+        self.assertIn(
+            {
+                "type": "award",
+                "data": {
+                    "choreography": choreography.pk,
+                    "name": "Test choreography 3",
+                    "award_type": "Default award",
+                },
+            },
+            messages,
+        )
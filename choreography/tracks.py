@@ -0,0 +1,402 @@
+import csv
+import io
+import json
+import os
+import uuid
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection
+from django.utils.translation import gettext as _
+from pydub.exceptions import CouldntDecodeError
+
+from academy.storage import get_content_hash
+from choreography.audio import (
+    get_audio_duration,
+    get_audio_format,
+    render_normalized_mp3,
+)
+from choreography.models import (
+    Choreography,
+    TrackStatusChoices,
+    playback_path,
+    track_path,
+)
+
+# Folder, relative to the music track storage, holding the pending rename journals.
+MUSIC_TRACK_JOURNAL_DIR = "music_track_journal"
+# Bytes copied from a music track into the ZIP archive before yielding.
+PLAYLIST_CHUNK_SIZE = 1024 * 1024
+
+
+def ingest_music_track(choreography_pk):
+    """
+    Validate the format of a newly uploaded music track, probe its duration and move it
+    to its normalized name. Return the resulting track status.
+    """
+    choreography = Choreography.objects.select_related("academy", "category").get(
+        pk=choreography_pk
+    )
+    music_track = choreography.music_track
+    if not music_track or not choreography.music_track_processing:
+        return choreography.track_status
+
+    original_name = music_track.name
+    # Only flip the state if the music track was not replaced in the meantime.
+    pending = Choreography.objects.filter(
+        pk=choreography_pk,
+        music_track=original_name,
+        track_status=TrackStatusChoices.PROCESSING,
+    )
+    ext = os.path.splitext(original_name)[1].lower().lstrip(".")
+    try:
+        with music_track.open("rb"):
+            if get_audio_format(music_track) != ext:
+                raise ValueError(original_name)
+            duration = get_audio_duration(music_track)
+    except (OSError, ValueError, CouldntDecodeError):
+        pending.update(track_status=TrackStatusChoices.FAILED)
+        return TrackStatusChoices.FAILED
+
+    storage = music_track.storage
+    new_name = choreography.get_music_track_name()
+    renamed = new_name != original_name and not storage.exists(new_name)
+    if renamed:
+        os.rename(storage.path(original_name), storage.path(new_name))
+    else:
+        new_name = original_name
+
+    updated = pending.update(
+        music_track=new_name, duration=duration, track_status=TrackStatusChoices.READY
+    )
+    if not updated:
+        if renamed:
+            os.rename(storage.path(new_name), storage.path(original_name))
+        return Choreography.objects.values_list("track_status", flat=True).get(
+            pk=choreography_pk
+        )
+    return TrackStatusChoices.READY
+
+
+def transcode_music_track(choreography_pk):
+    """
+    Render the loudness normalized MP3 derivative of a ready music track, unless one
+    already exists for the same content. Return the derivative name.
+    """
+    choreography = Choreography.objects.get(pk=choreography_pk)
+    music_track = choreography.music_track
+    if not music_track or choreography.track_status != TrackStatusChoices.READY:
+        return None
+
+    with music_track.open("rb"):
+        content_hash = get_content_hash(music_track)
+    storage = music_track.storage
+    name = playback_path(content_hash)
+    if not storage.exists(name):
+        os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+        rendering = storage.path(f"{name}.{uuid.uuid4().hex}.tmp")
+        try:
+            render_normalized_mp3(
+                music_track.path, rendering, settings.AUDIO_LOUDNESS_TARGET
+            )
+            os.replace(rendering, storage.path(name))
+        finally:
+            if os.path.exists(rendering):
+                os.remove(rendering)
+
+    Choreography.objects.filter(
+        pk=choreography_pk, music_track=music_track.name
+    ).update(music_track_hash=content_hash)
+    return name
+
+
+def transcode_music_tracks(choreography_pks):
+    """
+    Render the playback derivatives of the given Choreography instances, running up to
+    AUDIO_WORKERS ffmpeg processes at once. Return the derivative names.
+    """
+
+    def transcode_in_thread(choreography_pk):
+        try:
+            return transcode_music_track(choreography_pk)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=settings.AUDIO_WORKERS) as pool:
+        return list(pool.map(transcode_in_thread, choreography_pks))
+
+
+def get_music_track_storage():
+    return Choreography._meta.get_field("music_track").storage
+
+
+def plan_music_track_renames(queryset):
+    """
+    Compute the old and new music track names of every Choreography instance in the
+    queryset. Return a {pk: (old name, new name)} mapping of the renames that can be
+    applied and the list of PKs skipped because their new name is already taken.
+    """
+    storage = get_music_track_storage()
+    queryset = (
+        queryset.exclude(music_track="")
+        .exclude(music_track__isnull=True)
+        .exclude(track_status=TrackStatusChoices.PROCESSING)
+        .select_related("academy")
+    )
+    moves = {}
+    for choreography in queryset:
+        new_name = choreography.get_music_track_name()
+        if new_name != choreography.music_track.name:
+            moves[choreography.pk] = (choreography.music_track.name, new_name)
+
+    # Drop renames onto a name used twice or by a file that stays in place, until
+    # every remaining target is free once the planned sources are moved away.
+    collisions = []
+    while True:
+        sources = {old_name for old_name, new_name in moves.values()}
+        targets = Counter(new_name for old_name, new_name in moves.values())
+        colliding = [
+            pk
+            for pk, (old_name, new_name) in moves.items()
+            if targets[new_name] > 1
+            or (new_name not in sources and storage.exists(new_name))
+        ]
+        if not colliding:
+            return moves, collisions
+        for pk in colliding:
+            del moves[pk]
+        collisions.extend(colliding)
+
+
+def get_journal_dir():
+    return get_music_track_storage().path(MUSIC_TRACK_JOURNAL_DIR)
+
+
+def write_journal(path, journal):
+    """Durably replace the journal at the given path."""
+    with open(f"{path}.tmp", "w") as journal_file:
+        json.dump(journal, journal_file)
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    os.replace(f"{path}.tmp", path)
+
+
+def _move(storage, source, target):
+    if storage.exists(source) and not storage.exists(target):
+        os.makedirs(os.path.dirname(storage.path(target)), exist_ok=True)
+        os.rename(storage.path(source), storage.path(target))
+
+
+def run_journal(path, journal, rollback=False):
+    """
+    Move the files listed in the journal in two passes: every source is first moved to
+    a temporary name, then every temporary file to its target, so renames into each
+    other's names never overwrite a music track. Rolling back walks the same passes in
+    reverse. Save the resulting names and remove the journal.
+    """
+    storage = get_music_track_storage()
+    moves = journal["moves"]
+    if rollback:
+        if journal["staged"]:
+            for pk, old_name, new_name, temp_name in moves:
+                _move(storage, new_name, temp_name)
+        for pk, old_name, new_name, temp_name in moves:
+            _move(storage, temp_name, old_name)
+    else:
+        if not journal["staged"]:
+            for pk, old_name, new_name, temp_name in moves:
+                _move(storage, old_name, temp_name)
+            journal["staged"] = True
+            write_journal(path, journal)
+        for pk, old_name, new_name, temp_name in moves:
+            _move(storage, temp_name, new_name)
+
+    Choreography.objects.bulk_update(
+        [
+            Choreography(pk=pk, music_track=old_name if rollback else new_name)
+            for pk, old_name, new_name, temp_name in moves
+        ],
+        ["music_track"],
+        batch_size=500,
+    )
+    os.remove(path)
+
+
+def apply_music_track_renames(moves):
+    """
+    Apply the planned renames in one pass, recording them in a journal first so that an
+    interrupted run can be resumed or rolled back. Return the amount renamed.
+    """
+    if not moves:
+        return 0
+    journal_id = uuid.uuid4().hex
+    journal_dir = get_journal_dir()
+    os.makedirs(journal_dir, exist_ok=True)
+    path = os.path.join(journal_dir, f"{journal_id}.json")
+    journal = {
+        "staged": False,
+        "moves": [
+            [pk, old_name, new_name, f"{old_name}.{journal_id}.tmp"]
+            for pk, (old_name, new_name) in moves.items()
+        ],
+    }
+    write_journal(path, journal)
+    run_journal(path, journal)
+    return len(moves)
+
+
+def recover_music_track_renames(rollback=False):
+    """
+    Resume, or roll back, every rename run left behind by an interrupted process.
+    Return the amount of journals recovered.
+    """
+    journal_dir = get_journal_dir()
+    if not os.path.isdir(journal_dir):
+        return 0
+    recovered = 0
+    for file_name in sorted(os.listdir(journal_dir)):
+        path = os.path.join(journal_dir, file_name)
+        if not file_name.endswith(".json"):
+            # A journal that was never completely written, no file was renamed yet.
+            os.remove(path)
+            continue
+        with open(path) as journal_file:
+            run_journal(path, json.load(journal_file), rollback=rollback)
+        recovered += 1
+    return recovered
+
+
+def rename_music_tracks(choreography_pks):
+    """
+    Move the music track of every given Choreography instance to its normalized name.
+    Return the amount renamed and the PKs skipped because of a name collision.
+    """
+    moves, collisions = plan_music_track_renames(
+        Choreography.objects.filter(pk__in=choreography_pks)
+    )
+    return apply_music_track_renames(moves), collisions
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """Unseekable file object collecting what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def get_playlist_queryset(queryset):
+    return (
+        queryset.exclude(order_number__isnull=True)
+        .select_related("academy", "category", "dance_mode", "schedule")
+        .order_by("schedule__date", "order_number")
+    )
+
+
+def get_playlist_entries(choreographies):
+    """
+    Return (choreography, source name, playlist file name) tuples, preferring the
+    loudness normalized derivative of every ready music track over the upload.
+    """
+    entries = []
+    for choreography in choreographies:
+        source, file_name = None, ""
+        if (
+            choreography.music_track
+            and choreography.track_status == TrackStatusChoices.READY
+        ):
+            source = choreography.playback_track_name or choreography.music_track.name
+            file_name = os.path.basename(track_path(choreography, source))
+        entries.append((choreography, source, file_name))
+    return entries
+
+
+def render_m3u(entries):
+    lines = ["#EXTM3U"]
+    for choreography, source, file_name in entries:
+        if file_name:
+            lines.append(
+                f"#EXTINF:{int(choreography.duration.total_seconds())},"
+                f"{choreography.academy.name} - {choreography.name}"
+            )
+            lines.append(file_name)
+    return "\n".join(lines) + "\n"
+
+
+def render_cue_sheet(entries):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(
+        [
+            _("Order number"),
+            _("Academy"),
+            _("Name"),
+            _("Category"),
+            _("Dance mode"),
+            _("Duration"),
+            _("Music track"),
+        ]
+    )
+    for choreography, source, file_name in entries:
+        writer.writerow(
+            [
+                choreography.order_number,
+                choreography.academy.name,
+                choreography.name,
+                choreography.category,
+                choreography.dance_mode,
+                choreography.duration,
+                file_name,
+            ]
+        )
+    return output.getvalue()
+
+
+def stream_playlist_zip(queryset):
+    """
+    Yield a ZIP archive with a folder per schedule date holding the music tracks in
+    order number order, an M3U playlist and a CSV cue sheet. Music tracks are stored
+    uncompressed and copied in chunks, so the archive is never held in memory.
+    """
+    storage = get_music_track_storage()
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for date, choreographies in groupby(
+            get_playlist_queryset(queryset),
+            lambda choreography: choreography.schedule.date,
+        ):
+            folder = date.isoformat()
+            entries = get_playlist_entries(choreographies)
+            archive.writestr(f"{folder}/playlist.m3u", render_m3u(entries))
+            archive.writestr(f"{folder}/cue_sheet.csv", render_cue_sheet(entries))
+            yield buffer.drain()
+
+            for choreography, source, file_name in entries:
+                if not source:
+                    continue
+                try:
+                    track = storage.open(source, "rb")
+                except FileNotFoundError:
+                    continue
+                with track, archive.open(
+                    f"{folder}/{file_name}", "w", force_zip64=True
+                ) as entry:
+                    while chunk := track.read(PLAYLIST_CHUNK_SIZE):
+                        entry.write(chunk)
+                        yield buffer.drain()
+                yield buffer.drain()
+    yield buffer.drain()
@@ -84,9 +84,25 @@ urlpatterns = [
                     views.toggle_disqualified,
                     name="toggle_disqualified",
                 ),
+                path(
+                    "batch_update/<int:event_pk>/",
+                    views.score_batch_update,
+                    name="score_batch_update",
+                ),
+                path("sync/<int:event_pk>/", views.score_sync, name="score_sync"),
                 path(
                     "lock_scores/<int:event_pk>/", views.lock_scores, name="lock_scores"
                 ),
+                path(
+                    "feedback/<int:feedback_pk>/",
+                    views.feedback_audio,
+                    name="feedback_audio",
+                ),
+                path(
+                    "feedback_peaks/<int:feedback_pk>/",
+                    views.feedback_peaks,
+                    name="feedback_peaks",
+                ),
                 path(
                     "delete_feedback/<int:score_pk>/",
                     views.feedback_delete_view,
@@ -100,6 +116,23 @@ urlpatterns = [
         include(
             [
                 path("list/<int:event_pk>/", views.music_list, name="music_list"),
+                path(
+                    "track/<int:choreography_pk>/",
+                    views.music_track_audio,
+                    name="music_track_audio",
+                ),
+                path(
+                    "peaks/<int:choreography_pk>/",
+                    views.music_track_peaks,
+                    name="music_track_peaks",
+                ),
+                path(
+                    "download/<int:event_pk>/",
+                    views.music_download,
+                    name="music_download",
+                ),
+                path("show/<int:schedule_pk>/", views.show_file, name="show_file"),
+                path("live/<int:event_pk>/", views.live_updates, name="live_updates"),
             ]
         ),
     ),
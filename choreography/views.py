@@ -1,25 +1,60 @@
 import json
-from datetime import date, datetime
+import uuid
+from datetime import datetime
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
 from django.views.decorators.http import require_POST
 from weasyprint import HTML
 
 from academy.models import Dancer, Professor
-from academy.views import has_academy, is_judge, is_owner, is_soundman
+from academy.views import has_academy, is_admin, is_judge, is_owner, is_soundman
 from choreography.forms import ChoreographyForm
+from choreography.live import (
+    get_scoring_progress,
+    is_live_updates_enabled,
+    publish_choreographies_progress,
+    stream_live_updates,
+)
 from choreography.models import Award, Choreography, Feedback, Payment, Score
-from event.models import AwardType, Event, Price, Schedule
+from choreography.ordering import assign_default_order, assign_order_numbers
+from choreography.payments import create_payment_batch
+from choreography.pricing import PriceResolver
+from choreography.scoring import (
+    get_judge_scores,
+    get_score_changes,
+    submit_scores,
+    sync_scores,
+)
+from choreography.serving import serve_protected_file
+from choreography.shows import get_show_name, has_show_files
+from choreography.tasks import rename_music_tracks_task, render_waveform_peaks_task
+from choreography.tracks import (
+    get_music_track_storage,
+    stream_playlist_zip,
+)
+from choreography.waveforms import (
+    claim_peaks_rendering,
+    get_peaks_name,
+    get_peaks_source,
+    has_current_peaks,
+    has_source,
+)
+from event.models import AwardType, Event, Schedule
 from seminar.models import SeminarRegistration
 
 OSUser = get_user_model()
@@ -160,11 +195,7 @@ def choreography_create_view(request, event_pk):
 
         # Set the price according to the selected category.
         category = form.cleaned_data.get("category")
-        price = Price.objects.filter(
-            event=event,
-            category_type=category.type,
-            due_date__gte=timezone.now().date(),
-        ).first()
+        price = PriceResolver(event).get_current_price(category.type)
         if price:
             form.instance.price = price
         else:
@@ -298,11 +329,7 @@ def choreography_update_view(request, choreography_pk):
         # Set the price according to the selected category if changed.
         if "category" in form.changed_data:
             category = form.cleaned_data.get("category")
-            price = Price.objects.filter(
-                event=event,
-                category_type=category.type,
-                due_date__gte=timezone.now().date(),
-            ).first()
+            price = PriceResolver(event).get_current_price(category.type)
             if price:
                 form.instance.price = price
             else:
@@ -345,29 +372,26 @@ def choreography_update_view(request, choreography_pk):
 @require_POST
 def set_order_number(request):
     choreographies_dict = json.loads(request.POST.get("choreographies_json"))
-    updated = 0
+    changed = []
 
     if "set_new_order" in request.POST:
-        for key, value in choreographies_dict.items():
-            if value:
-                choreography = Choreography.objects.get(pk=key)
-                choreography.order_number = int(value)
-                choreography.save(update_fields=["order_number"])
-                updated += 1
+        changed = assign_order_numbers(
+            {
+                int(key): int(value)
+                for key, value in choreographies_dict.items()
+                if value
+            }
+        )
 
     elif "set_default_order" in request.POST:
-        ids_list = [key for key, value in choreographies_dict.items()]
-        queryset = Choreography.objects.filter(pk__in=ids_list)
-        updated = queryset.update(order_number=None)
-        ordered_list = queryset.filter(
-            event__end_date__gte=timezone.now().date()
-        ).order_by("schedule__date", "schedule__time", "category__max_age")
-
-        i = 1
-        for choreography in ordered_list:
-            choreography.order_number = i
-            choreography.save()
-            i += 1
+        queryset = Choreography.objects.filter(pk__in=choreographies_dict.keys())
+        changed = assign_default_order(queryset)
+
+    updated = len(changed)
+    # Move the music tracks to their new names outside the request.
+    if changed:
+        transaction.on_commit(lambda: rename_music_tracks_task.delay(changed))
+    publish_choreographies_progress(changed)
 
     message = ngettext(
         "Successfully updated %(count)d choreography order number!",
@@ -568,11 +592,12 @@ def payment_list_view(request, event_pk):
             Q(name__icontains=search_input) | Q(category__name__icontains=search_input)
         )
 
-    amount_total, balance_total, deposit_total = 0, 0, 0
-    for choreography in queryset:
-        amount_total += choreography.total_price
-        deposit_total += choreography.deposit_amount
-        balance_total += choreography.balance
+    queryset = queryset.with_financials()
+    totals = queryset.aggregate(
+        amount_total=Sum("price_total", default=0),
+        deposit_amount_total=Sum("deposit_total", default=0),
+        balance_amount_total=Sum("balance", default=0),
+    )
 
     paginator = Paginator(queryset, 10)
     page_number = request.GET.get("page")
@@ -585,9 +610,9 @@ def payment_list_view(request, event_pk):
         "search_input": search_input,
         "search_text": _("Search by category or choreography name."),
         "choreographies_amount": queryset.count(),
-        "amount_total": amount_total,
-        "deposit_total": deposit_total,
-        "balance_total": balance_total,
+        "amount_total": totals["amount_total"],
+        "deposit_total": totals["deposit_amount_total"],
+        "balance_total": totals["balance_amount_total"],
         "title": _("Payment list"),
     }
     return render(request, "choreography/payment_list.html", context)
@@ -624,11 +649,7 @@ def payment_detail(request, choreography_pk):
         return redirect("home")
 
     event = choreography.event
-    price = Price.objects.filter(event=event, due_date__gte=date.today()).first()
-    if price:
-        next_due_date = price.due_date
-    else:
-        next_due_date = Price.objects.filter(event=event).last().due_date
+    next_due_date = PriceResolver(event).get_next_due_date(choreography.category.type)
 
     context = {
         "model": Payment,
@@ -669,27 +690,15 @@ def manage_payments_view(request):
         messages.warning(request, _("The payment date cannot be later than today."))
         return redirect("admin:choreography_choreography_changelist")
 
-    created = 0
-
-    if "pay_deposit_amount" in request.POST:
-        for choreography in choreographies_qs:
-            if not choreography.deposit_paid:
-                Payment.objects.create(
-                    choreography=choreography,
-                    amount=choreography.deposit_amount,
-                    type=selected_payment_method,
-                    date=payment_date,
-                )
-                created += 1
-    elif "pay_balance_amount" in request.POST:
-        for choreography in choreographies_qs:
-            Payment.objects.create(
-                choreography=choreography,
-                amount=choreography.balance,
-                type=selected_payment_method,
-                date=payment_date,
-            )
-            created += 1
+    batch, payments = None, []
+    if "pay_deposit_amount" in request.POST or "pay_balance_amount" in request.POST:
+        batch, payments = create_payment_batch(
+            choreographies_qs,
+            selected_payment_method,
+            payment_date,
+            deposit="pay_deposit_amount" in request.POST,
+        )
+    created = len(payments)
 
     message = ngettext(
         "Successfully created %(count)d payment!",
@@ -697,6 +706,8 @@ def manage_payments_view(request):
         created,
     ) % {"count": created}
     messages.info(request, message)
+    if created:
+        messages.info(request, _("Payment batch ID: %(batch)s") % {"batch": batch})
     return redirect("admin:choreography_choreography_changelist")
 
 
@@ -727,30 +738,30 @@ def score_list_view(request, event_pk):
 
     event = get_object_or_404(Event, pk=event_pk)
 
-    score_qs = Score.objects.filter(
-        judge=request.user,
-        choreography__event=event,
-        choreography__schedule__date=timezone.now().date(),
-    ).order_by("choreography__order_number")
+    score_qs = get_judge_scores(request.user, event).order_by(
+        "choreography__order_number"
+    )
 
     if request.method == "POST":
-        score_pk = request.POST.get("score_pk")
-        score = get_object_or_404(Score, pk=score_pk)
-        if score.is_locked:
+        score_pk = request.POST.get("score_pk", "")
+        score_feedback = request.FILES.get("score_feedback")
+        try:
+            # Anything but one of the judge's score PKs is rejected as not theirs.
+            if not score_pk.isdigit():
+                raise PermissionDenied
+            submit_scores(
+                request.user,
+                event,
+                {int(score_pk): request.POST.get("score_value")},
+                {int(score_pk): score_feedback} if score_feedback else None,
+            )
+        except PermissionDenied:
             messages.warning(
                 request, _("You don't have permissions to perform this action.")
             )
             return redirect("home")
-
-        score_feedback = request.FILES.get("score_feedback")
-        if score_feedback:
-            Feedback.objects.update_or_create(
-                score=score, defaults={"audio_file": score_feedback}
-            )
-
-        score_value = request.POST.get("score_value")
-        score.value = score_value if score_value else 0
-        score.save()
+        except ValidationError as error:
+            messages.warning(request, error.message)
 
     paginator = Paginator(score_qs, 10)
     page_number = request.GET.get("page")
@@ -765,6 +776,95 @@ def score_list_view(request, event_pk):
     return render(request, "choreography/score_list.html", context)
 
 
+@login_required
+@user_passes_test(is_judge)
+@require_POST
+def score_batch_update(request, event_pk):
+    """
+    Save every submitted "score_<pk>" value and "feedback_<pk>" recording of the
+    logged-in judge at once, or none of them if any score is locked.
+    """
+    event = get_object_or_404(Event, pk=event_pk)
+    values = {
+        int(key.removeprefix("score_")): value
+        for key, value in request.POST.items()
+        if key.startswith("score_") and key.removeprefix("score_").isdigit()
+    }
+    feedbacks = {
+        int(key.removeprefix("feedback_")): audio_file
+        for key, audio_file in request.FILES.items()
+        if key.startswith("feedback_") and key.removeprefix("feedback_").isdigit()
+    }
+
+    try:
+        updated = len(submit_scores(request.user, event, values, feedbacks))
+    except PermissionDenied:
+        messages.warning(
+            request, _("You don't have permissions to perform this action.")
+        )
+        return redirect("home")
+    except ValidationError as error:
+        messages.warning(request, error.message)
+    else:
+        message = ngettext(
+            "Successfully saved %(count)d score!",
+            "Successfully saved %(count)d scores!",
+            updated,
+        ) % {"count": updated}
+        messages.success(request, message)
+
+    page_number = request.GET.get("page", "")
+    response = redirect("score_list", event_pk=event.pk)
+    if page_number:
+        response["Location"] += f"?page={page_number}"
+    return response
+
+
+def parse_sync_datetime(value):
+    parsed = datetime.fromisoformat(value)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_sync_operation(operation):
+    return {
+        "key": str(uuid.UUID(operation["key"])),
+        "score": int(operation["score"]),
+        "value": operation.get("value"),
+        "recorded": parse_sync_datetime(operation["recorded"]),
+        "feedback": bool(operation.get("feedback")),
+    }
+
+
+@login_required
+@user_passes_test(is_judge)
+def score_sync(request, event_pk):
+    """
+    Return the logged-in judge's scores of today changed after the "since" cursor, or
+    apply the score changes queued offline and posted as "operations", returning the
+    outcome of each of them by key.
+    """
+    event = get_object_or_404(Event, pk=event_pk)
+    if request.method == "POST":
+        try:
+            operations = [
+                parse_sync_operation(operation)
+                for operation in json.loads(request.POST["operations"])
+            ]
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse(
+                {"error": _("The submitted operations are not valid.")}, status=400
+            )
+        results = sync_scores(request.user, event, operations, request.FILES)
+        return JsonResponse({"results": results})
+
+    since = request.GET.get("since")
+    try:
+        since = parse_sync_datetime(since) if since else None
+    except ValueError:
+        since = None
+    return JsonResponse(get_score_changes(request.user, event, since))
+
+
 @login_required
 @user_passes_test(is_judge)
 def toggle_disqualified(request, choreography_pk):
@@ -810,12 +910,9 @@ def toggle_disqualified(request, choreography_pk):
 @user_passes_test(is_judge)
 def lock_scores(request, event_pk):
     event = get_object_or_404(Event, pk=event_pk)
-    scores_qs = Score.objects.filter(
-        judge=request.user,
-        choreography__event=event,
-        choreography__schedule__date=timezone.now().date(),
-    )
-    locked_scores = scores_qs.update(is_locked=True)
+    scores_qs = get_judge_scores(request.user, event)
+    # Move the scores past the sync cursor so offline judges learn about the lock.
+    locked_scores = scores_qs.update(is_locked=True, change_date=timezone.now())
 
     if locked_scores:
         message = ngettext(
@@ -842,6 +939,7 @@ def feedback_delete_view(request, score_pk):
     if hasattr(score, "feedback"):
         feedback = score.feedback
         feedback.delete()
+        Score.objects.filter(pk=score.pk).update(change_date=timezone.now())
         messages.success(request, _("Feedback successfully deleted."))
 
     page_number = request.GET.get("page", "")
@@ -851,6 +949,67 @@ def feedback_delete_view(request, score_pk):
     return response
 
 
+def can_listen_feedback(request, feedback):
+    # Check if the user is a judge or the academy can already see the awards.
+    choreography = feedback.score.choreography
+    return is_judge(request.user) or (
+        has_academy(request.user)
+        and is_owner(request, choreography)
+        and choreography.show_awards
+    )
+
+
+def serve_waveform_peaks(request, instance):
+    """Serve the waveform peaks of an instance, rendering them if missing or outdated."""
+    source = get_peaks_source(instance)
+    if not has_source(instance):
+        raise Http404
+    if not has_current_peaks(instance):
+        if claim_peaks_rendering(instance):
+            render_waveform_peaks_task.delay(instance._meta.model_name, instance.pk)
+        # Eager tasks, as in DEBUG, have rendered the peaks already.
+        if not has_current_peaks(instance):
+            return HttpResponse(status=404)
+    return serve_protected_file(request, source.storage, get_peaks_name(instance))
+
+
+@login_required
+def feedback_audio(request, feedback_pk):
+    """
+    Serve a Feedback instance audio file to judges, or to the related academy once the
+    awards are shown, supporting byte ranges and conditional requests.
+    """
+    feedback = get_object_or_404(
+        Feedback.objects.select_related("score__choreography__academy"),
+        pk=feedback_pk,
+    )
+    if not can_listen_feedback(request, feedback) or not feedback.audio_file:
+        messages.warning(
+            request, _("You don't have permissions to perform this action.")
+        )
+        return redirect("home")
+
+    return serve_protected_file(
+        request, feedback.audio_file.storage, feedback.audio_file.name
+    )
+
+
+@login_required
+def feedback_peaks(request, feedback_pk):
+    """Serve the waveform peaks of a Feedback instance audio file."""
+    feedback = get_object_or_404(
+        Feedback.objects.select_related("score__choreography__academy"),
+        pk=feedback_pk,
+    )
+    if not can_listen_feedback(request, feedback) or not feedback.audio_file:
+        messages.warning(
+            request, _("You don't have permissions to perform this action.")
+        )
+        return redirect("home")
+
+    return serve_waveform_peaks(request, feedback)
+
+
 # endregion
 # region Soundman
 
@@ -886,6 +1045,7 @@ def music_list(request, event_pk):
         schedule = get_object_or_404(Schedule, pk=selected_schedule)
         choreography_qs = choreography_qs.filter(schedule__date=schedule.date)
         context["selected_schedule"] = schedule
+        context["has_show_files"] = has_show_files(event.pk, schedule.date)
 
     paginator = Paginator(choreography_qs, 10)
     page_number = request.GET.get("page", "")
@@ -895,4 +1055,130 @@ def music_list(request, event_pk):
     return render(request, "choreography/music_list.html", context)
 
 
+def can_listen_music_track(request, choreography):
+    # Check if the user is a soundman, a judge or belongs to the academy.
+    return (
+        is_soundman(request.user)
+        or is_judge(request.user)
+        or (has_academy(request.user) and is_owner(request, choreography))
+    )
+
+
+@login_required
+def music_track_audio(request, choreography_pk):
+    """
+    Serve a Choreography instance music track to its academy, judges and soundmen,
+    supporting byte ranges and conditional requests. Serve the loudness normalized
+    derivative instead if the "playback" parameter is given and it was rendered.
+    """
+    choreography = get_object_or_404(
+        Choreography.objects.select_related("academy"), pk=choreography_pk
+    )
+    if (
+        not can_listen_music_track(request, choreography)
+        or not choreography.music_track
+    ):
+        messages.warning(
+            request, _("You don't have permissions to perform this action.")
+        )
+        return redirect("home")
+
+    name = choreography.music_track.name
+    if "playback" in request.GET:
+        name = choreography.playback_track_name or name
+    return serve_protected_file(request, choreography.music_track.storage, name)
+
+
+def can_download_show(user):
+    # Check if the user is a soundman or a staff member.
+    return is_soundman(user) or user.is_staff
+
+
+@login_required
+@user_passes_test(can_download_show)
+def show_file(request, schedule_pk):
+    """
+    Serve the rendered show audio of a schedule date to soundmen and staff members, or
+    its cue index if the "cues" parameter is given.
+    """
+    schedule = get_object_or_404(Schedule, pk=schedule_pk)
+    extension = "json" if "cues" in request.GET else "mp3"
+    name = f"{get_show_name(schedule.event_id, schedule.date)}.{extension}"
+    return serve_protected_file(request, get_music_track_storage(), name)
+
+
+@login_required
+def music_track_peaks(request, choreography_pk):
+    """Serve the waveform peaks of a Choreography instance music track."""
+    choreography = get_object_or_404(
+        Choreography.objects.select_related("academy"), pk=choreography_pk
+    )
+    if (
+        not can_listen_music_track(request, choreography)
+        or not choreography.music_track
+    ):
+        messages.warning(
+            request, _("You don't have permissions to perform this action.")
+        )
+        return redirect("home")
+
+    return serve_waveform_peaks(request, choreography)
+
+
+@login_required
+@user_passes_test(is_soundman)
+def music_download(request, event_pk):
+    """
+    Stream a ZIP archive with the selected event music tracks, ordered by order number
+    and grouped by schedule date, along with an M3U playlist and a CSV cue sheet.
+    """
+    event = get_object_or_404(Event, pk=event_pk)
+    choreography_qs = Choreography.objects.filter(event=event)
+    file_name = event.name
+
+    selected_schedule = request.GET.get("schedule_filter")
+    if selected_schedule:
+        schedule = get_object_or_404(Schedule, pk=selected_schedule, event=event)
+        choreography_qs = choreography_qs.filter(schedule__date=schedule.date)
+        file_name = f"{event.name} {schedule.date.isoformat()}"
+
+    response = StreamingHttpResponse(
+        stream_playlist_zip(choreography_qs), content_type="application/zip"
+    )
+    response["Content-Disposition"] = content_disposition_header(
+        True, f"{file_name}.zip"
+    )
+    return response
+
+
+def can_follow_live_updates(user):
+    # Check if the user is an admin or a soundman.
+    return user.is_superuser or is_admin(user) or is_soundman(user)
+
+
+@login_required
+@user_passes_test(can_follow_live_updates)
+async def live_updates(request, event_pk):
+    """
+    Stream the scoring progress, order number on stage and award changes of an event as
+    server-sent events, or return the scoring progress as JSON when polled. The stream
+    never ends, so it is only served over ASGI: WSGI would buffer it forever.
+    """
+    event = await aget_object_or_404(Event, pk=event_pk)
+    progress = await sync_to_async(get_scoring_progress)(event.pk)
+    if "poll" in request.GET:
+        return JsonResponse(progress)
+    if not isinstance(request, ASGIRequest) or not is_live_updates_enabled():
+        # A 204 response stops EventSource reconnecting, so clients poll instead.
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        stream_live_updates(event.pk, progress), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Keep nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 # endregion
@@ -0,0 +1,68 @@
+import os
+import uuid
+
+from django.core.cache import cache
+
+from choreography.audio import compute_peaks, decode_pcm
+from choreography.models import Choreography, Feedback
+
+# Folder, relative to the audio storage, holding the waveform peaks files.
+PEAKS_DIR = "peaks"
+# Seconds during which a missing peaks file is not queued for rendering again.
+PEAKS_PENDING_TIMEOUT = 600
+
+
+def get_peaks_source(instance):
+    """Return the audio file the waveform of a Choreography or Feedback is drawn from."""
+    if isinstance(instance, Choreography):
+        return instance.music_track
+    return instance.audio_file
+
+
+def get_peaks_name(instance):
+    return f"{PEAKS_DIR}/{instance._meta.model_name}/{instance.pk}.bin"
+
+
+def has_source(instance):
+    source = get_peaks_source(instance)
+    return bool(source) and source.storage.exists(source.name)
+
+
+def has_current_peaks(instance):
+    """Check if the audio file and its peaks file exist, the latter being newer."""
+    if not has_source(instance):
+        return False
+    source = get_peaks_source(instance)
+    storage = source.storage
+    name = get_peaks_name(instance)
+    return storage.exists(name) and os.path.getmtime(
+        storage.path(name)
+    ) >= os.path.getmtime(source.path)
+
+
+def render_peaks(instance):
+    """Compute and store the waveform peaks of a Choreography or Feedback instance."""
+    if not has_source(instance):
+        return None
+    source = get_peaks_source(instance)
+    storage = source.storage
+    name = get_peaks_name(instance)
+    os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+    rendering = storage.path(f"{name}.{uuid.uuid4().hex}.tmp")
+    with open(rendering, "wb") as peaks:
+        peaks.write(compute_peaks(decode_pcm(source.path)))
+    os.replace(rendering, storage.path(name))
+    return name
+
+
+def render_peaks_by_pk(model_name, pk):
+    model = {"choreography": Choreography, "feedback": Feedback}[model_name]
+    instance = model.objects.filter(pk=pk).first()
+    return render_peaks(instance) if instance else None
+
+
+def claim_peaks_rendering(instance):
+    """Return True only for the first caller asking to render missing peaks."""
+    return cache.add(
+        f"peaks_pending_{get_peaks_name(instance)}", True, PEAKS_PENDING_TIMEOUT
+    )
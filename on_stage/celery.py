@@ -14,10 +14,17 @@ app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 if not settings.DEBUG:
     app.conf.beat_schedule = {
-        # Executes every day at 12:00 hs.
-        "choreography_price_update": {
-            "name": "update_choreography_price",
-            "task": "choreography.tasks.update_choreography_price",
+        # Executes every day at 00:30 hs and reprices the past day price transitions
+        # again, in case one of their scheduled tasks was lost.
+        "reprice_past_price_transitions": {
+            "name": "reprice_past_price_transitions",
+            "task": "reprice_past_price_transitions",
+            "schedule": crontab(hour=0, minute=30),
+        },
+        # Executes every day at 12:00 hs and only schedules the next day price transitions.
+        "schedule_price_transitions": {
+            "name": "schedule_price_transitions",
+            "task": "schedule_price_transitions",
             "schedule": crontab(hour=12, minute=0),
         },
     }
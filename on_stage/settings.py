@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from decouple import config
@@ -98,6 +99,24 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": config("CACHE_URL", default=config("CELERY_BROKER_URL")),
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -156,6 +175,42 @@ STATIC_ROOT = str([BASE_DIR / "static"][0])
 MEDIA_URL = "/media/"
 MEDIA_ROOT = str([BASE_DIR / "media"][0])
 
+# Server sending protected media after the permissions checks: "nginx" for
+# X-Accel-Redirect to PROTECTED_MEDIA_URL, "apache" for X-Sendfile or empty for Django.
+PROTECTED_MEDIA_SERVER = config("PROTECTED_MEDIA_SERVER", default="")
+PROTECTED_MEDIA_URL = config("PROTECTED_MEDIA_URL", default="/protected/")
+
+
+# Audio processing settings
+# Amount of ffmpeg processes run in parallel by each audio task.
+AUDIO_WORKERS = config("AUDIO_WORKERS", default=os.cpu_count() or 1, cast=int)
+# Integrated loudness, in LUFS, every rendered track is normalized to.
+AUDIO_LOUDNESS_TARGET = config("AUDIO_LOUDNESS_TARGET", default=-16, cast=float)
+# Seconds of silence between choreographies in the rendered show files.
+SHOW_SILENCE_GAP = config("SHOW_SILENCE_GAP", default=5, cast=float)
+
+
+# Award settings
+# Seconds during which the score changes of a choreography are coalesced into a single
+# default award recompute. Awards are recomputed right away if 0.
+AWARD_RECOMPUTE_DELAY = config(
+    "AWARD_RECOMPUTE_DELAY", default=0 if DEBUG else 5, cast=float
+)
+# Normalization of the judges' scores awards are assigned by: "zscore" rescales every
+# judge's scores to the spread of the whole event, "trimmed" drops the highest and
+# lowest scores of every choreography. Awards use the plain average score if empty.
+SCORE_NORMALIZATION = config("SCORE_NORMALIZATION", default="")
+# Scores dropped from each end of a choreography's scores by the trimmed normalization.
+SCORE_TRIM_COUNT = config("SCORE_TRIM_COUNT", default=1, cast=int)
+
+
+# Live updates settings
+# Redis server whose pub/sub channels fan out scoring progress, running order and award
+# changes to the live updates stream. Live updates are off for other URLs.
+LIVE_UPDATES_URL = config("LIVE_UPDATES_URL", default=config("CELERY_BROKER_URL"))
+# Seconds between keepalive comments sent on an idle live updates stream.
+LIVE_UPDATES_KEEPALIVE = config("LIVE_UPDATES_KEEPALIVE", default=15, cast=float)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -188,10 +243,18 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "America/Argentina/Cordoba"
 CELERY_ENABLE_UTC = True
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# Hours ahead price transitions are scheduled. The daily run at noon covers midnight.
+PRICE_TRANSITIONS_HORIZON = config("PRICE_TRANSITIONS_HORIZON", default=13, cast=int)
+# Keep scheduled price transitions from being redelivered before they are due, while
+# other unacknowledged tasks are redelivered soon after a worker crash.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": (PRICE_TRANSITIONS_HORIZON + 1) * 3600
+}
 
 
 # For testing purposes
 if DEBUG:
-    CELERY_ALWAYS_EAGER = True
-    CELERY_EAGER_PROPAGATES = True
+    # Tasks run in the calling process, as no worker is expected to be running.
+    CELERY_TASK_ALWAYS_EAGER = True
+    CELERY_TASK_EAGER_PROPAGATES = True
     BROKER_BACKEND = "memory"